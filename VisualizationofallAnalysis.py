@@ -5,24 +5,75 @@ import numpy as np
 import streamlit as st
 import pandas as pd
 
+from data_loader import aggregated_by, preview_of, uses_period, uses_tables
+from kernels import group_sum, stratified_sample
+from moments import Moments
+from pipeline import step
+from sketches import SpaceSaving
 
-def plot_inventory_quantity(inventory_df, product_df, subcategory_df, category_df):
-    inventory_df['ProductID'] = inventory_df['ProductID'].astype(str)
-    product_df['ProductID'] = product_df['ProductID'].astype(str)
-    product_df['ProductSubcategoryID'] = product_df['ProductSubcategoryID'].astype(str)
-    subcategory_df['ProductSubcategoryID'] = subcategory_df['ProductSubcategoryID'].astype(str)
-    subcategory_df['ProductCategoryID'] = subcategory_df['ProductCategoryID'].astype(str)
-    category_df['ProductCategoryID'] = category_df['ProductCategoryID'].astype(str)
+# Fiscal year 2014 (July 2013 - June 2014)
+FY2014 = ('2013-07-01', '2014-06-30')
 
-    merged = inventory_df.merge(product_df[['ProductID', 'ProductSubcategoryID']], on='ProductID', how='left')
-    merged = merged.merge(subcategory_df[['ProductSubcategoryID', 'ProductCategoryID']], on='ProductSubcategoryID', how='left')
-    merged = merged.merge(category_df[['ProductCategoryID', 'Name']], on='ProductCategoryID', how='left')
+# Rows a sampled preview draws from, before the exact chart replaces it
+PREVIEW_ROWS = 5000
 
-    category_summary = merged.groupby('Name')['Quantity'].sum().reset_index()
-    sorted_data = category_summary.sort_values('Quantity', ascending=False)
 
+# ---------- Shared analysis steps ----------
+@step(InventoryCube=['ProductID', 'Quantity'])
+def inventory_per_product(dataframes):
+    inventory_cube = dataframes['InventoryCube']
+    return group_sum(inventory_cube['ProductID'], inventory_cube['Quantity'])
+
+
+@step(SalesOrderDetail=['ProductID', 'OrderQty'])
+def sales_per_product(dataframes):
+    sales = dataframes['SalesOrderDetail']
+    return group_sum(sales['ProductID'], sales['OrderQty'])
+
+
+@step(WorkOrder=['ProductID', 'OrderQty'])
+def production_per_product(dataframes):
+    workorder = dataframes['WorkOrder']
+    return group_sum(workorder['ProductID'], workorder['OrderQty'])
+
+
+@step(sales_per_product, production_per_product, ProductDimension=None)
+def subcategory_sales_and_production(dataframes, sales, production):
+    product_names = dataframes['ProductDimension'][['SubcategoryName', 'CategoryName']]
+
+    # Look up Subcategory and Category names for the per-product sums
+    sales_merge = sales.to_frame().join(product_names)
+    workorder_merge = production.to_frame().join(product_names)
+
+    # Aggregate sales and production
+    sales_summary = (
+        sales_merge.groupby(['CategoryName', 'SubcategoryName'])['OrderQty']
+        .sum()
+        .reset_index()
+        .rename(columns={'CategoryName': 'Category', 'SubcategoryName': 'SubCategory', 'OrderQty': 'TotalSalesQty'})
+    )
+
+    production_summary = (
+        workorder_merge.groupby(['CategoryName', 'SubcategoryName'])['OrderQty']
+        .sum()
+        .reset_index()
+        .rename(columns={'CategoryName': 'Category', 'SubcategoryName': 'SubCategory', 'OrderQty': 'TotalProducedQty'})
+    )
+
+    # Merge summaries
+    return pd.merge(sales_summary, production_summary, on=['Category', 'SubCategory'], how='outer').fillna(0)
+
+
+@uses_tables(InventoryCube=None)
+def aggregate_inventory_quantity(inventory_cube):
+    category_summary = inventory_cube.groupby('CategoryName')['Quantity'].sum().reset_index()
+    return category_summary.sort_values('Quantity', ascending=False)
+
+
+@aggregated_by(aggregate_inventory_quantity)
+def plot_inventory_quantity(sorted_data):
     plt.figure(figsize=(14, 7))
-    sns.barplot(data=sorted_data, x='Quantity', y='Name', palette='viridis')
+    sns.barplot(data=sorted_data, x='Quantity', y='CategoryName', palette='viridis')
     plt.title('Inventory Quantity by Product Category', fontsize=20, fontweight='bold')
     plt.xlabel('Quantity', fontsize=15)
     plt.ylabel('Product Category', fontsize=15)
@@ -33,14 +84,29 @@ def plot_inventory_quantity(inventory_df, product_df, subcategory_df, category_d
     st.pyplot(plt.gcf())
 
 
-def plot_demand_vs_supply(demand_supply):
-    df_melt = demand_supply.melt(
+@uses_tables(
+    Product=['ProductID', 'Name'],
+    ProductInventory=['ProductID', 'Quantity'],
+    DemandForecast=['ProductID', 'Forecast'],
+)
+def aggregate_demand_vs_supply(product_df, inventory_df, forecast_df):
+    demand_supply = product_df[['ProductID', 'Name']].merge(
+        group_sum(inventory_df['ProductID'], inventory_df['Quantity']).reset_index(),
+        on='ProductID', how='left'
+    ).fillna({'Quantity': 0})
+    # Demand is next month's forecast order quantity; products never sold have none
+    demand_supply['OrderQty'] = demand_supply['ProductID'].map(forecast_df.set_index('ProductID')['Forecast']).fillna(0)
+
+    return demand_supply.melt(
         id_vars='Name', 
         value_vars=['OrderQty', 'Quantity'], 
         var_name='Type', 
         value_name='Amount'
     )
-    
+
+
+@aggregated_by(aggregate_demand_vs_supply)
+def plot_demand_vs_supply(df_melt):
     plt.figure(figsize=(14, 7))
     sns.barplot(data=df_melt, x='Name', y='Amount', hue='Type', palette='Set2')
     plt.xticks(rotation=90)
@@ -55,41 +121,16 @@ def plot_demand_vs_supply(demand_supply):
 
 
 
-def plot_inventory_value_by_category(dataframes):
-    product_df = dataframes['Product']
-    product_inventory_df = dataframes['ProductInventory']
-    product_subcategory_df = dataframes['ProductSubcategory']
-    product_category_df = dataframes['ProductCategory']
-
-    product_df['ProductID'] = product_df['ProductID'].astype(str)
-    product_inventory_df['ProductID'] = product_inventory_df['ProductID'].astype(str)
-    product_df['ProductSubcategoryID'] = product_df['ProductSubcategoryID'].astype(str)
-    product_subcategory_df['ProductSubcategoryID'] = product_subcategory_df['ProductSubcategoryID'].astype(str)
-    product_subcategory_df['ProductCategoryID'] = product_subcategory_df['ProductCategoryID'].astype(str)
-    product_category_df['ProductCategoryID'] = product_category_df['ProductCategoryID'].astype(str)
-
-    inventory_per_product = product_inventory_df.groupby('ProductID')['Quantity'].sum().reset_index()
-
-    inventory_with_cost = inventory_per_product.merge(
-        product_df[['ProductID', 'StandardCost', 'ProductSubcategoryID']],
-        on='ProductID', how='left'
-    )
-
-    inventory_with_cost['InventoryValue'] = inventory_with_cost['Quantity'] * inventory_with_cost['StandardCost']
-
-    inventory_with_subcat = inventory_with_cost.merge(
-        product_subcategory_df[['ProductSubcategoryID', 'ProductCategoryID']],
-        on='ProductSubcategoryID', how='left'
-    )
+@uses_tables(InventoryCube=None)
+def aggregate_inventory_value_by_category(dataframes):
+    inventory_cube = dataframes['InventoryCube']
 
-    inventory_with_cat = inventory_with_subcat.merge(
-        product_category_df[['ProductCategoryID', 'Name']],
-        on='ProductCategoryID', how='left'
-    ).rename(columns={'Name': 'CategoryName'})
+    category_inventory_value = inventory_cube.groupby('CategoryName')['InventoryValue'].sum().reset_index()
+    return category_inventory_value.sort_values(by='InventoryValue', ascending=False)
 
-    category_inventory_value = inventory_with_cat.groupby('CategoryName')['InventoryValue'].sum().reset_index()
-    category_inventory_value = category_inventory_value.sort_values(by='InventoryValue', ascending=False)
 
+@aggregated_by(aggregate_inventory_value_by_category)
+def plot_inventory_value_by_category(category_inventory_value):
     plt.figure(figsize=(14, 6))
 
     plt.subplot(1, 2, 1)
@@ -113,27 +154,14 @@ def plot_inventory_value_by_category(dataframes):
     st.pyplot(plt.gcf())
 
 
-def plot_space_utilization_by_category_location(
-    product_df, product_inventory_df, product_subcategory_df, product_category_df, location_df, use_streamlit=True
-):
-    product_df['ProductID'] = product_df['ProductID'].astype(str)
-    product_inventory_df['ProductID'] = product_inventory_df['ProductID'].astype(str)
-    product_inventory_df['LocationID'] = product_inventory_df['LocationID'].astype(str)
-    product_df['ProductSubcategoryID'] = product_df['ProductSubcategoryID'].astype(str)
-    product_subcategory_df['ProductSubcategoryID'] = product_subcategory_df['ProductSubcategoryID'].astype(str)
-    product_subcategory_df['ProductCategoryID'] = product_subcategory_df['ProductCategoryID'].astype(str)
-    product_category_df['ProductCategoryID'] = product_category_df['ProductCategoryID'].astype(str)
-    location_df['LocationID'] = location_df['LocationID'].astype(str)
+@uses_tables(InventoryCube=None)
+def aggregate_space_utilization_by_category_location(inventory_cube):
+    space_utilization = inventory_cube.groupby(['LocationName', 'CategoryName'])['Quantity'].sum().reset_index()
+    return space_utilization.pivot(index='LocationName', columns='CategoryName', values='Quantity').fillna(0)
 
-    inventory_loc = product_inventory_df.groupby(['ProductID', 'LocationID'])['Quantity'].sum().reset_index()
-    inventory_loc = inventory_loc.merge(product_df[['ProductID', 'ProductSubcategoryID']], on='ProductID', how='left')
-    inventory_loc = inventory_loc.merge(product_subcategory_df[['ProductSubcategoryID', 'ProductCategoryID']], on='ProductSubcategoryID', how='left')
-    inventory_loc = inventory_loc.merge(product_category_df[['ProductCategoryID', 'Name']], on='ProductCategoryID', how='left').rename(columns={'Name': 'CategoryName'})
-    inventory_loc = inventory_loc.merge(location_df[['LocationID', 'Name']], on='LocationID', how='left').rename(columns={'Name': 'LocationName'})
-
-    space_utilization = inventory_loc.groupby(['LocationName', 'CategoryName'])['Quantity'].sum().reset_index()
-    space_pivot = space_utilization.pivot(index='LocationName', columns='CategoryName', values='Quantity').fillna(0)
 
+@aggregated_by(aggregate_space_utilization_by_category_location)
+def plot_space_utilization_by_category_location(space_pivot, use_streamlit=True):
     plt.figure(figsize=(14, 8))
     sns.heatmap(space_pivot, annot=True, fmt=".0f", cmap='YlGnBu')
     plt.title('Warehouse Space Utilization by Category and Location', fontsize=16, fontweight='bold')
@@ -147,49 +175,96 @@ def plot_space_utilization_by_category_location(
         plt.show()
 
 
+@uses_tables(InventoryCube=None)
+def aggregate_inventory_comparison(inventory_cube, compare_by, values, level, measure, top=None):
+    # Every compared value in one grouped pass over the cube, rather than one filtered run per value
+    selected = inventory_cube[inventory_cube[compare_by].isin(values)]
+    comparison = selected.groupby([compare_by, level])[measure].sum().reset_index()
+    comparison = comparison.sort_values(measure, ascending=False)
+    if top is not None:
+        comparison = comparison.groupby(compare_by).head(top)
+    return comparison
+
+
+@aggregated_by(aggregate_inventory_comparison)
+def plot_inventory_comparison(comparison):
+    compare_by, level, measure = comparison.columns
+    panels = comparison[compare_by].unique()
+    if not len(panels):
+        st.info("No inventory for the selected values.")
+        return
+
+    # One small multiple per compared value, on a shared measure axis
+    columns = min(len(panels), 3)
+    rows = -(-len(panels) // columns)
+    fig, axes = plt.subplots(rows, columns, figsize=(6 * columns, 5 * rows), sharex=True, squeeze=False)
+    for ax, value in zip(axes.flat, panels):
+        panel = comparison[comparison[compare_by] == value]
+        sns.barplot(data=panel, x=measure, y=level, palette='viridis', ax=ax)
+        ax.set_title(str(value), fontsize=14, fontweight='bold')
+        ax.set_xlabel(measure)
+        ax.set_ylabel('')
+    for ax in axes.flat[len(panels):]:
+        ax.axis('off')
+
+    fig.suptitle(f'{measure} by {level} per {compare_by}', fontsize=16, fontweight='bold')
+    plt.tight_layout()
+    st.pyplot(fig)
 
 
 
 
-def plot_lead_time_by_category(workorder_df, product_df, product_subcategory_df, product_category_df):
-    # Convert IDs to strings
-    workorder_df['ProductID'] = workorder_df['ProductID'].astype(str)
-    product_df['ProductID'] = product_df['ProductID'].astype(str)
-    product_df['ProductSubcategoryID'] = product_df['ProductSubcategoryID'].astype(str)
-    product_subcategory_df['ProductSubcategoryID'] = product_subcategory_df['ProductSubcategoryID'].astype(str)
-    product_subcategory_df['ProductCategoryID'] = product_subcategory_df['ProductCategoryID'].astype(str)
-    product_category_df['ProductCategoryID'] = product_category_df['ProductCategoryID'].astype(str)
 
-    # Convert StartDate and EndDate to datetime
-    workorder_df['StartDate'] = pd.to_datetime(workorder_df['StartDate'])
-    workorder_df['EndDate'] = pd.to_datetime(workorder_df['EndDate'])
 
-    # Calculate Lead Time
-    workorder_df['LeadTimeDays'] = (workorder_df['EndDate'] - workorder_df['StartDate']).dt.days
-    workorder_df = workorder_df[workorder_df['LeadTimeDays'] >= 0]
+@uses_tables(
+    WorkOrder=['ProductID', 'StartDate', 'EndDate'],
+    ProductDimension=None,
+)
+def aggregate_lead_time_by_category(workorder_df, product_dim):
+    # Calculate Lead Time alongside the work orders rather than on them
+    lead_time = (workorder_df['EndDate'] - workorder_df['StartDate']).dt.days
+    leadtime_df = pd.DataFrame({'ProductID': workorder_df['ProductID'], 'LeadTimeDays': lead_time})
+    leadtime_df = leadtime_df[leadtime_df['LeadTimeDays'] >= 0]
 
     # Merge to get Category Name
-    leadtime_with_product = workorder_df.merge(
-        product_df[['ProductID', 'ProductSubcategoryID']], on='ProductID', how='left'
-    ).merge(
-        product_subcategory_df[['ProductSubcategoryID', 'ProductCategoryID']], on='ProductSubcategoryID', how='left'
-    ).merge(
-        product_category_df[['ProductCategoryID', 'Name']], on='ProductCategoryID', how='left'
-    ).rename(columns={'Name': 'CategoryName'})
+    leadtime_with_product = leadtime_df.join(product_dim['CategoryName'], on='ProductID')
 
     # Drop missing category names
-    leadtime_with_product = leadtime_with_product.dropna(subset=['CategoryName'])
-
-    # Plot
+    return leadtime_with_product.dropna(subset=['CategoryName'])[['CategoryName', 'LeadTimeDays']]
+
+
+@preview_of(aggregate_lead_time_by_category)
+def preview_lead_time_by_category(workorder_df, product_dim):
+    # Stratified by category, so each box is drawn from enough work orders
+    if len(workorder_df) <= PREVIEW_ROWS:
+        return None
+    product_ids = workorder_df['ProductID']
+    categories = product_dim['CategoryName']
+    positions = stratified_sample(len(workorder_df), PREVIEW_ROWS, lambda drawn: product_ids.take(drawn).map(categories))
+    sample = workorder_df.take(positions)
+    preview = aggregate_lead_time_by_category(sample, product_dim)
+    preview.attrs.update(sampled=len(sample), total=len(workorder_df))
+    return preview
+
+
+@aggregated_by(aggregate_lead_time_by_category)
+def plot_lead_time_by_category(leadtime_with_product):
+    # Plot; a sampled preview is notched with the 95% confidence interval of each median
+    sampled = leadtime_with_product.attrs.get('sampled')
     st.subheader("🕒 Lead Time Distribution by Product Category")
     plt.figure(figsize=(14, 8))
-    sns.boxplot(data=leadtime_with_product, x='CategoryName', y='LeadTimeDays')
+    sns.boxplot(data=leadtime_with_product, x='CategoryName', y='LeadTimeDays', notch=sampled is not None)
     plt.xticks(rotation=45, ha='right')
     plt.title('Lead Time Distribution by Product Category')
     plt.xlabel('Product Category')
     plt.ylabel('Lead Time (Days)')
     plt.tight_layout()
     st.pyplot(plt)
+    if sampled is not None:
+        st.caption(
+            f"⏳ Preview from a stratified sample of {sampled:,} of {leadtime_with_product.attrs['total']:,} work orders; "
+            "notches show 95% confidence intervals of the medians. Refining to the full data…"
+        )
 
 
 
@@ -197,16 +272,15 @@ def plot_lead_time_by_category(workorder_df, product_df, product_subcategory_df,
 
 
 
-def plot_top_suppliers_by_sales_value(sales_detail_df, product_df):
-    # Ensure matching types
-    sales_detail_df['ProductID'] = sales_detail_df['ProductID'].astype(str)
-    product_df['ProductID'] = product_df['ProductID'].astype(str)
-
+@uses_tables(
+    SalesOrderDetail=['ProductID', 'OrderQty', 'LineTotal'],
+    Product=['ProductID', 'ProductModelID'],
+)
+def aggregate_top_suppliers_by_sales_value(sales_detail_df, product_df):
     # Aggregate sales by ProductID
-    product_sales = sales_detail_df.groupby('ProductID').agg(
-        TotalVolume=('OrderQty', 'sum'),
-        TotalValue=('LineTotal', 'sum')
-    ).reset_index()
+    product_sales = group_sum(
+        sales_detail_df['ProductID'], sales_detail_df[['OrderQty', 'LineTotal']]
+    ).rename(columns={'OrderQty': 'TotalVolume', 'LineTotal': 'TotalValue'}).reset_index()
 
     # Merge ProductModelID (acts as proxy for supplier)
     product_sales = product_sales.merge(
@@ -222,8 +296,11 @@ def plot_top_suppliers_by_sales_value(sales_detail_df, product_df):
     ).reset_index()
 
     # Sort and select top 10
-    top_suppliers = supplier_like.sort_values(by='TotalValue', ascending=False).head(10)
+    return supplier_like.sort_values(by='TotalValue', ascending=False).head(10)
+
 
+@aggregated_by(aggregate_top_suppliers_by_sales_value)
+def plot_top_suppliers_by_sales_value(top_suppliers):
     # Plotting
     st.subheader("🏅 Top 10 Proxy Suppliers by Sales Value (via ProductModelID)")
     plt.figure(figsize=(12, 7))
@@ -236,32 +313,62 @@ def plot_top_suppliers_by_sales_value(sales_detail_df, product_df):
     st.pyplot(plt)
 
 
+@uses_tables(SupplierSalesSketch=None)
+def aggregate_top_suppliers_from_sketch(supplier_sketch):
+    # Read off the streaming sketch instead of grouping every order line; values may overestimate by Error
+    sketch = SpaceSaving.from_frame(supplier_sketch)
+    top_suppliers = sketch.top(10).rename(columns={'Count': 'TotalValue'})
+    top_suppliers.attrs.update(total=sketch.total, capacity=sketch.capacity)
+    return top_suppliers
 
 
+@aggregated_by(aggregate_top_suppliers_from_sketch)
+def plot_top_suppliers_approx(top_suppliers):
+    # Plotting, with each bar's possible overestimate as a one-sided error bar
+    st.subheader("🏅 Top 10 Proxy Suppliers by Sales Value (approximate)")
+    plt.figure(figsize=(12, 7))
+    plt.barh(
+        top_suppliers['ProductModelID'].astype(str), top_suppliers['TotalValue'],
+        xerr=[top_suppliers['Error'], [0] * len(top_suppliers)], color='orange', ecolor='gray', capsize=3
+    )
+    plt.xlabel('Total Sales Value (upper estimate)')
+    plt.ylabel('ProductModelID (Proxy Supplier)')
+    plt.title('Top 10 Proxy Suppliers by Sales Value')
+    plt.gca().invert_yaxis()
+    plt.tight_layout()
+    st.pyplot(plt)
 
-def plot_top_products_by_inventory_quantity(product_inventory_df, product_df):
+    st.caption(
+        f"Streamed into {top_suppliers.attrs['capacity']} counters; any value is at most "
+        f"{top_suppliers.attrs['total'] / top_suppliers.attrs['capacity']:,.0f} above the true total. "
+        f"{int(top_suppliers['Guaranteed'].sum())} of {len(top_suppliers)} suppliers are certain to be in the top 10."
+    )
 
-    # Ensure ProductID is the same type
-    product_inventory_df['ProductID'] = product_inventory_df['ProductID'].astype(int)
-    product_df['ProductID'] = product_df['ProductID'].astype(int)
 
-    # Aggregate inventory by ProductID
-    actual_inventory = product_inventory_df.groupby('ProductID')['Quantity'].sum().reset_index()
 
-    # Merge with product names
-    actual_inventory = actual_inventory.merge(
-        product_df[['ProductID', 'Name']],
-        on='ProductID',
-        how='left'
-    )
+
+
+@uses_tables(
+    InventoryCube=None,
+    ProductDimension=None,
+)
+def aggregate_top_products_by_inventory_quantity(inventory_cube, product_dim):
+    # Roll the cube up to products
+    actual_inventory = inventory_per_product({'InventoryCube': inventory_cube}).reset_index()
+
+    # Look up product names
+    actual_inventory = actual_inventory.join(product_dim['ProductName'], on='ProductID')
 
     # Sort and get top 10
-    top_inventory = actual_inventory.sort_values(by='Quantity', ascending=False).head(10)
+    return actual_inventory.sort_values(by='Quantity', ascending=False).head(10)
+
 
+@aggregated_by(aggregate_top_products_by_inventory_quantity)
+def plot_top_products_by_inventory_quantity(top_inventory):
     # Plotting
     st.subheader("📦 Top 10 Products by Actual Inventory Quantity")
     plt.figure(figsize=(12, 7))
-    plt.barh(top_inventory['Name'], top_inventory['Quantity'], color='steelblue')
+    plt.barh(top_inventory['ProductName'], top_inventory['Quantity'], color='steelblue')
     plt.xlabel('Actual Inventory Quantity')
     plt.title('Top 10 Products by Actual Inventory')
     plt.gca().invert_yaxis()
@@ -271,28 +378,26 @@ def plot_top_products_by_inventory_quantity(product_inventory_df, product_df):
 
 
 
-def plot_inventory_vs_safety_stock(product_inventory_df, product_df):
-
-    # Ensure ProductID is consistent type
-    product_inventory_df['ProductID'] = product_inventory_df['ProductID'].astype(int)
-    product_df['ProductID'] = product_df['ProductID'].astype(int)
-
-    # Aggregate inventory quantity
-    actual_inventory = product_inventory_df.groupby('ProductID')['Quantity'].sum().reset_index()
+@uses_tables(
+    InventoryCube=None,
+    ProductDimension=None,
+)
+def aggregate_inventory_vs_safety_stock(inventory_cube, product_dim):
+    # Roll the cube up to products
+    actual_inventory = inventory_per_product({'InventoryCube': inventory_cube}).reset_index()
 
-    # Merge with product details
-    inventory_vs_safety = actual_inventory.merge(
-        product_df[['ProductID', 'Name', 'SafetyStockLevel']],
-        on='ProductID',
-        how='left'
-    )
+    # Look up product details
+    inventory_vs_safety = actual_inventory.join(product_dim[['ProductName', 'SafetyStockLevel']], on='ProductID')
 
     # Filter valid safety stock levels
     inventory_vs_safety = inventory_vs_safety[inventory_vs_safety['SafetyStockLevel'] > 0]
 
     # Sort and limit to top 20 by safety stock
-    inventory_vs_safety = inventory_vs_safety.sort_values('SafetyStockLevel', ascending=False).head(20)
+    return inventory_vs_safety.sort_values('SafetyStockLevel', ascending=False).head(20)
 
+
+@aggregated_by(aggregate_inventory_vs_safety_stock)
+def plot_inventory_vs_safety_stock(inventory_vs_safety):
     # Plot
     st.subheader("🛡️ Actual Inventory vs Safety Stock Level (Top 20 Products)")
     plt.figure(figsize=(12, 8))
@@ -302,7 +407,7 @@ def plot_inventory_vs_safety_stock(product_inventory_df, product_df):
     plt.bar(indices, inventory_vs_safety['Quantity'], width=bar_width, label='Actual Inventory', color='steelblue')
     plt.bar([i + bar_width for i in indices], inventory_vs_safety['SafetyStockLevel'], width=bar_width, label='Safety Stock Level', color='orange')
 
-    plt.xticks([i + bar_width / 2 for i in indices], inventory_vs_safety['Name'], rotation=90)
+    plt.xticks([i + bar_width / 2 for i in indices], inventory_vs_safety['ProductName'], rotation=90)
     plt.ylabel('Quantity')
     plt.title('Actual Inventory vs Safety Stock Level for Top 20 Products')
     plt.legend()
@@ -315,46 +420,36 @@ def plot_inventory_vs_safety_stock(product_inventory_df, product_df):
 
 
 
-def plot_fill_rate_by_product_category(sales_df, wo_df, product_df, subcategory_df, category_df):
-
-
-    # Step 0: Ensure consistent data types
-    sales_df['ProductID'] = sales_df['ProductID'].astype(str)
-    wo_df['ProductID'] = wo_df['ProductID'].astype(str)
-    product_df['ProductID'] = product_df['ProductID'].astype(str)
+@uses_tables(
+    SalesOrderDetail=['ProductID', 'OrderQty'],
+    WorkOrder=['ProductID', 'EndDate', 'DueDate', 'StockedQty'],
+    ProductDimension=None,
+)
+def aggregate_fill_rate_by_product_category(sales_df, wo_df, product_dim):
 
     # Step 1: Calculate Total Quantity Ordered per Product
-    total_ordered = sales_df.groupby('ProductID')['OrderQty'].sum().reset_index()
-    total_ordered.rename(columns={'OrderQty': 'TotalOrdered'}, inplace=True)
+    total_ordered = sales_per_product({'SalesOrderDetail': sales_df}).reset_index(name='TotalOrdered')
 
     # Step 2: Calculate Quantity Shipped On Time per Product
-    wo_df['EndDate'] = pd.to_datetime(wo_df['EndDate'], errors='coerce')
-    wo_df['DueDate'] = pd.to_datetime(wo_df['DueDate'], errors='coerce')
     shipped_on_time = wo_df[wo_df['EndDate'] <= wo_df['DueDate']]
-    shipped_qty = shipped_on_time.groupby('ProductID')['StockedQty'].sum().reset_index()
-    shipped_qty.rename(columns={'StockedQty': 'ShippedOnTime'}, inplace=True)
+    shipped_qty = group_sum(shipped_on_time['ProductID'], shipped_on_time['StockedQty']).reset_index(name='ShippedOnTime')
 
     # Step 3: Merge and Calculate Fill Rate
-    fill_rate_df = pd.merge(total_ordered, shipped_qty, on='ProductID', how='left')
-    fill_rate_df['ShippedOnTime'].fillna(0, inplace=True)
+    fill_rate_df = pd.merge(total_ordered, shipped_qty, on='ProductID', how='left').fillna({'ShippedOnTime': 0})
     fill_rate_df['FillRate'] = (fill_rate_df['ShippedOnTime'] / fill_rate_df['TotalOrdered']) * 100
 
     # Step 4: Add Product Category Info
-    product_info = product_df[['ProductID', 'ProductSubcategoryID']]
-    product_info = pd.merge(product_info, subcategory_df[['ProductSubcategoryID', 'ProductCategoryID']], on='ProductSubcategoryID', how='left')
-    product_info = pd.merge(product_info, category_df[['ProductCategoryID', 'Name']], on='ProductCategoryID', how='left')
-    product_info.rename(columns={'Name': 'ProductCategory'}, inplace=True)
+    fill_rate_df = fill_rate_df.join(product_dim['CategoryName'].rename('ProductCategory'), on='ProductID')
 
-    product_info['ProductID'] = product_info['ProductID'].astype(str)
-    fill_rate_df['ProductID'] = fill_rate_df['ProductID'].astype(str)
-
-    fill_rate_df = pd.merge(fill_rate_df, product_info[['ProductID', 'ProductCategory']], on='ProductID', how='left')
-
-    # Step 5: Aggregate and Plot
+    # Step 5: Aggregate
     category_fill = fill_rate_df.groupby('ProductCategory')['FillRate'].mean().reset_index()
+    return category_fill.sort_values('FillRate', ascending=False)
+
 
+@aggregated_by(aggregate_fill_rate_by_product_category)
+def plot_fill_rate_by_product_category(category_fill):
     plt.figure(figsize=(10, 6))
-    sns.barplot(data=category_fill.sort_values('FillRate', ascending=False),
+    sns.barplot(data=category_fill,
                 x='FillRate', y='ProductCategory', palette='viridis')
     plt.title('📦 Average Inventory Fill Rate by Product Category')
     plt.xlabel('Fill Rate (%)')
@@ -369,39 +464,28 @@ def plot_fill_rate_by_product_category(sales_df, wo_df, product_df, subcategory_
 
 
 
-def plot_cost_of_stockouts(sales_order_detail, inventory_df, product_df):
+@uses_tables(
+    ProductFacts=None,
+    ProductDimension=None,
+)
+def aggregate_cost_of_stockouts(product_facts, product_dim):
 
 
-    # Step 1: Aggregate orders by product
-    orders_by_product = sales_order_detail.groupby('ProductID')['OrderQty'].sum().reset_index()
-    orders_by_product.rename(columns={'OrderQty': 'TotalOrdered'}, inplace=True)
+    # Step 1: Products with orders, and the ordered quantity inventory cannot cover
+    stockout_df = product_facts[product_facts['SalesQty'].notna()][['ProductID', 'Shortfall']]
 
-    # Step 2: Aggregate available inventory by product
-    inventory_by_product = inventory_df.groupby('ProductID')['Quantity'].sum().reset_index()
-    inventory_by_product.rename(columns={'Quantity': 'InventoryAvailable'}, inplace=True)
+    # Step 2: Look up product prices and names
+    stockout_df = stockout_df.join(product_dim[['ListPrice', 'ProductName']], on='ProductID')
+    stockout_df = stockout_df.rename(columns={'ProductName': 'Name'})
 
-    # 🔧 Ensure both ProductID columns are of the same type
-    orders_by_product['ProductID'] = orders_by_product['ProductID'].astype(str)
-    inventory_by_product['ProductID'] = inventory_by_product['ProductID'].astype(str)
-
-    # Step 3: Merge and calculate stockout
-    stockout_df = orders_by_product.merge(inventory_by_product, on='ProductID', how='left')
-    stockout_df['InventoryAvailable'].fillna(0, inplace=True)
-    stockout_df['Shortfall'] = stockout_df['TotalOrdered'] - stockout_df['InventoryAvailable']
-    stockout_df['Shortfall'] = stockout_df['Shortfall'].apply(lambda x: max(x, 0))
-
-    # Step 4: Merge with product prices
-    product_df['ProductID'] = product_df['ProductID'].astype(str)
-    price_df = product_df[['ProductID', 'ListPrice']]
-    stockout_df = stockout_df.merge(price_df, on='ProductID', how='left')
+    # Step 3: Cost the shortfall and keep the top 10
     stockout_df['CostOfStockout'] = stockout_df['Shortfall'] * stockout_df['ListPrice']
-    stockout_df = stockout_df.sort_values('CostOfStockout', ascending=False).head(10)
+    return stockout_df.sort_values('CostOfStockout', ascending=False).head(10)
 
-    # Step 5: Merge with product name
-    name_df = product_df[['ProductID', 'Name']]
-    stockout_df = stockout_df.merge(name_df, on='ProductID', how='left')
 
-    # Step 6: Plot
+@aggregated_by(aggregate_cost_of_stockouts)
+def plot_cost_of_stockouts(stockout_df):
+    # Step 4: Plot
     plt.figure(figsize=(10, 6))
     sns.barplot(data=stockout_df, x='CostOfStockout', y='Name', palette='Reds_r')
     plt.title("💸 Top 10 Products by Cost of Stockouts")
@@ -417,20 +501,13 @@ def plot_cost_of_stockouts(sales_order_detail, inventory_df, product_df):
 
 
 
-def plot_picking_efficiency(work_order_routing_df, work_order_df, product_df, location_df):
-
-
-    # --- Ensure consistent merge key types ---
-    for df in [work_order_routing_df, work_order_df, product_df]:
-        if 'ProductID' in df.columns:
-            df['ProductID'] = df['ProductID'].astype(str)
-    if 'ProductID' in location_df.columns:
-        location_df['ProductID'] = location_df['ProductID'].astype(str)
-
-    if 'LocationID' in work_order_routing_df.columns:
-        work_order_routing_df['LocationID'] = work_order_routing_df['LocationID'].astype(str)
-    if 'LocationID' in location_df.columns:
-        location_df['LocationID'] = location_df['LocationID'].astype(str)
+@uses_tables(
+    WorkOrderRouting=['WorkOrderID', 'ProductID', 'LocationID', 'ActualResourceHrs', 'ActualCost'],
+    WorkOrder=['WorkOrderID', 'ProductID', 'StockedQty'],
+    Product=['ProductID', 'Name'],
+    Location=['LocationID', 'Name'],
+)
+def aggregate_picking_efficiency(work_order_routing_df, work_order_df, product_df, location_df):
 
     # Step 1: Aggregate time and cost
     routing_agg = work_order_routing_df.groupby(['WorkOrderID', 'ProductID', 'LocationID']).agg({
@@ -445,8 +522,7 @@ def plot_picking_efficiency(work_order_routing_df, work_order_df, product_df, lo
 
     # Step 3: Merge and calculate per-pick efficiency
     merged = pd.merge(routing_agg, work_order_agg, on=['WorkOrderID', 'ProductID'], how='left')
-    merged['StockedQty'].replace(0, pd.NA, inplace=True)
-    merged.dropna(subset=['StockedQty'], inplace=True)
+    merged = merged[merged['StockedQty'].fillna(0) != 0]
     merged['TimePerPick'] = merged['ActualResourceHrs'] / merged['StockedQty']
     merged['CostPerPick'] = merged['ActualCost'] / merged['StockedQty']
 
@@ -466,11 +542,15 @@ def plot_picking_efficiency(work_order_routing_df, work_order_df, product_df, lo
     )
 
     # Step 6: Drop NA values
-    efficiency.dropna(subset=['TimePerPick', 'CostPerPick', 'Name_Product', 'Name_Location'], inplace=True)
+    efficiency = efficiency.dropna(subset=['TimePerPick', 'CostPerPick', 'Name_Product', 'Name_Location'])
+
+    # Step 7: Top 10 by TimePerPick
+    return efficiency.sort_values('TimePerPick', ascending=False).head(10)
 
-    # Step 7: Plot top 10 by TimePerPick
-    top_time = efficiency.sort_values('TimePerPick', ascending=False).head(10)
 
+@aggregated_by(aggregate_picking_efficiency)
+def plot_picking_efficiency(top_time):
+    # Step 8: Plot
     fig, ax = plt.subplots(figsize=(12, 6))
     sns.barplot(
         data=top_time,
@@ -497,50 +577,30 @@ def plot_picking_efficiency(work_order_routing_df, work_order_df, product_df, lo
 
 
 
-def plot_inventory_by_subcategory(dataframes):
+@uses_tables(InventoryCube=None)
+def aggregate_inventory_by_subcategory(dataframes):
 
 
     # Validate required tables
-    required_tables = ['ProductInventory', 'Product', 'ProductSubcategory']
-    if not all(name in dataframes for name in required_tables):
-        st.error("❌ Required tables (ProductInventory, Product, ProductSubcategory) are missing.")
-        return
-
-    # --- Step 0: Ensure consistent dtypes for ProductID across all involved tables ---
-    for df_name in ['ProductInventory', 'Product']:
-        if 'ProductID' in dataframes[df_name].columns:
-            dataframes[df_name]['ProductID'] = dataframes[df_name]['ProductID'].astype(str)
-
-    # Step 1: Merge ProductInventory with Product to get ProductSubcategoryID
-    inventory_merged = pd.merge(
-        dataframes['ProductInventory'],
-        dataframes['Product'][['ProductID', 'ProductSubcategoryID']],
-        on='ProductID',
-        how='left'
-    )
+    if 'InventoryCube' not in dataframes:
+        return None
 
-    # Step 2: Ensure consistent data types for ProductSubcategoryID
-    inventory_merged['ProductSubcategoryID'] = pd.to_numeric(inventory_merged['ProductSubcategoryID'], errors='coerce')
-    dataframes['ProductSubcategory']['ProductSubcategoryID'] = pd.to_numeric(
-        dataframes['ProductSubcategory']['ProductSubcategoryID'], errors='coerce'
-    )
+    # Step 1: Group the cube by Subcategory Name and sum quantities
+    subcategory_summary = dataframes['InventoryCube'].groupby('SubcategoryName')['Quantity'].sum().reset_index()
+    return subcategory_summary.sort_values('Quantity', ascending=False)
 
-    # Step 3: Merge with ProductSubcategory to get Subcategory Names
-    inventory_with_subcat = pd.merge(
-        inventory_merged,
-        dataframes['ProductSubcategory'][['ProductSubcategoryID', 'Name']],
-        on='ProductSubcategoryID',
-        how='left'
-    )
 
-    # Step 4: Group by Subcategory Name and sum quantities
-    subcategory_summary = inventory_with_subcat.groupby('Name')['Quantity'].sum().reset_index()
+@aggregated_by(aggregate_inventory_by_subcategory)
+def plot_inventory_by_subcategory(subcategory_summary):
+    if subcategory_summary is None:
+        st.error("❌ Required table (InventoryCube) is missing.")
+        return
 
-    # Step 5: Plot
+    # Step 2: Plot
     plt.figure(figsize=(12, 8))
     sns.barplot(
-        data=subcategory_summary.sort_values('Quantity', ascending=False),
-        x='Quantity', y='Name',
+        data=subcategory_summary,
+        x='Quantity', y='SubcategoryName',
         palette='viridis'
     )
     plt.title('Inventory Quantity by Product Subcategory')
@@ -556,44 +616,36 @@ def plot_inventory_by_subcategory(dataframes):
 
 
 
-def plot_top_products_production_over_time(dataframes):
+@uses_tables(
+    ProductionMonthly=None,
+    ProductDimension=None,
+)
+def aggregate_top_products_production_over_time(dataframes):
 
 
     # --- Step 1: Load and Validate Required Tables ---
-    if 'WorkOrder' not in dataframes or 'Product' not in dataframes:
-        st.error("❌ Required tables ('WorkOrder' and 'Product') are missing.")
-        return
+    if 'ProductionMonthly' not in dataframes or 'ProductDimension' not in dataframes:
+        return None
 
-    workorder = dataframes['WorkOrder']
-    product = dataframes['Product']
+    # --- Step 2: Monthly production per product, with Product Names ---
+    monthly = dataframes['ProductionMonthly'][['Month', 'ProductID', 'OrderQty']]
+    monthly = monthly.join(dataframes['ProductDimension']['ProductName'], on='ProductID')
 
-    # --- Step 2: Merge to Get Product Name ---
-    workorder_product = pd.merge(
-        workorder,
-        product[['ProductID', 'Name']],
-        on='ProductID',
-        how='left'
-    )
-
-    # --- Step 3: Convert StartDate to datetime ---
-    workorder_product['StartDate'] = pd.to_datetime(workorder_product['StartDate'], errors='coerce')
-    workorder_product.dropna(subset=['StartDate'], inplace=True)
+    # --- Step 3: Group and Summarize ---
+    produced_summary = monthly.groupby(['Month', 'ProductName'])['OrderQty'].sum().reset_index()
+    produced_summary = produced_summary.rename(columns={'Month': 'YearMonth', 'OrderQty': 'TotalProduced'})
 
-    # --- Step 4: Extract Year and Month ---
-    workorder_product['Year'] = workorder_product['StartDate'].dt.year
-    workorder_product['Month'] = workorder_product['StartDate'].dt.month
-
-    # --- Step 5: Group and Summarize ---
-    produced_summary = workorder_product.groupby(['Year', 'Month', 'Name'])['OrderQty'].sum().reset_index()
-    produced_summary.rename(columns={'Name': 'ProductName', 'OrderQty': 'TotalProduced'}, inplace=True)
-
-    # --- Step 6: Filter Top 5 Products ---
+    # --- Step 4: Filter Top 5 Products ---
     top_products = produced_summary.groupby('ProductName')['TotalProduced'].sum().nlargest(5).index
-    filtered = produced_summary[produced_summary['ProductName'].isin(top_products)].copy()
+    filtered = produced_summary[produced_summary['ProductName'].isin(top_products)]
+    return filtered.sort_values(by='YearMonth')
 
-    # --- Step 7: Create YearMonth Column ---
-    filtered['YearMonth'] = pd.to_datetime(filtered['Year'].astype(str) + '-' + filtered['Month'].astype(str).str.zfill(2))
-    filtered.sort_values(by='YearMonth', inplace=True)
+
+@aggregated_by(aggregate_top_products_production_over_time)
+def plot_top_products_production_over_time(filtered):
+    if filtered is None:
+        st.error("❌ Required tables ('ProductionMonthly' and 'ProductDimension') are missing.")
+        return
 
     # --- Step 8: Plot ---
     plt.figure(figsize=(14, 6))
@@ -612,34 +664,34 @@ def plot_top_products_production_over_time(dataframes):
 
 
 
-def plot_scrap_quantity_by_reason(dataframes):
+@uses_tables(
+    WorkOrder=['ScrapReasonID', 'ScrappedQty'],
+    ScrapReason=['ScrapReasonID', 'Name'],
+)
+def aggregate_scrap_quantity_by_reason(dataframes):
 
     # Load required tables
     workorder = dataframes['WorkOrder']
-    product = dataframes['Product']
     scrapreason = dataframes['ScrapReason']
 
-    # Merge WorkOrder with Product to get Product Name
-    wo_product = pd.merge(workorder, product[['ProductID', 'Name']], on='ProductID', how='left')
-    wo_product.rename(columns={'Name': 'ProductName'}, inplace=True)
-
-    # Ensure ScrapReasonID columns are numeric
-    wo_product['ScrapReasonID'] = pd.to_numeric(wo_product['ScrapReasonID'], errors='coerce')
-    scrapreason['ScrapReasonID'] = pd.to_numeric(scrapreason['ScrapReasonID'], errors='coerce')
-
-    # Merge with ScrapReason to get Scrap Reason Name
-    wo_scrap = pd.merge(wo_product, scrapreason[['ScrapReasonID', 'Name']], on='ScrapReasonID', how='left')
-    wo_scrap.rename(columns={'Name': 'ScrapReason'}, inplace=True)
-
     # Filter rows where ScrappedQty > 0
-    scrap_data = wo_scrap[wo_scrap['ScrappedQty'] > 0]
+    scrap_data = workorder[workorder['ScrappedQty'] > 0]
+
+    # Sum per ScrapReasonID, then look up Scrap Reason Names
+    scrap_by_id = group_sum(scrap_data['ScrapReasonID'], scrap_data['ScrappedQty']).reset_index()
+    scrap_by_reason = scrap_by_id.merge(scrapreason[['ScrapReasonID', 'Name']], on='ScrapReasonID', how='left')
+    scrap_by_reason = scrap_by_reason.rename(columns={'Name': 'ScrapReason'})
 
     # Summarize scrapped quantity by reason
-    scrap_reason_summary = scrap_data.groupby('ScrapReason')['ScrappedQty'].sum().reset_index()
+    scrap_reason_summary = scrap_by_reason.groupby('ScrapReason')['ScrappedQty'].sum().reset_index()
+    return scrap_reason_summary.sort_values('ScrappedQty', ascending=False)
+
 
+@aggregated_by(aggregate_scrap_quantity_by_reason)
+def plot_scrap_quantity_by_reason(scrap_reason_summary):
     # Plotting
     plt.figure(figsize=(10, 6))
-    sns.barplot(data=scrap_reason_summary.sort_values('ScrappedQty', ascending=False),
+    sns.barplot(data=scrap_reason_summary,
                 x='ScrappedQty', y='ScrapReason', palette='magma')
     plt.title('Scrapped Quantity by Scrap Reason')
     plt.xlabel('Scrapped Quantity')
@@ -656,47 +708,19 @@ def plot_scrap_quantity_by_reason(dataframes):
 
 
 
-def plot_top_subcategories_by_sales_and_production(dataframes):
-    # Load tables
-    product = dataframes['Product']
-    subcategory = dataframes['ProductSubcategory']
-    category = dataframes['ProductCategory']
-    sales = dataframes['SalesOrderDetail']
-    workorder = dataframes['WorkOrder']
-
-    # Ensure numeric keys for safe merging
-    product['ProductSubcategoryID'] = pd.to_numeric(product['ProductSubcategoryID'], errors='coerce').astype('Int64')
-    subcategory['ProductCategoryID'] = pd.to_numeric(subcategory['ProductCategoryID'], errors='coerce').astype('Int64')
-    category['ProductCategoryID'] = pd.to_numeric(category['ProductCategoryID'], errors='coerce').astype('Int64')
-
-    # Merge Product → Subcategory → Category
-    prod_sub = pd.merge(product, subcategory, on='ProductSubcategoryID', how='left', suffixes=('', '_sub'))
-    prod_sub_cat = pd.merge(prod_sub, category, on='ProductCategoryID', how='left', suffixes=('', '_cat'))
-
-    # Merge with SalesOrderDetail and WorkOrder
-    sales_merge = pd.merge(sales, prod_sub_cat[['ProductID', 'Name_sub', 'Name_cat']], on='ProductID', how='left')
-    workorder_merge = pd.merge(workorder, prod_sub_cat[['ProductID', 'Name_sub', 'Name_cat']], on='ProductID', how='left')
-
-    # Aggregate sales and production
-    sales_summary = (
-        sales_merge.groupby(['Name_cat', 'Name_sub'])['OrderQty']
-        .sum()
-        .reset_index()
-        .rename(columns={'Name_cat': 'Category', 'Name_sub': 'SubCategory', 'OrderQty': 'TotalSalesQty'})
-    )
-
-    production_summary = (
-        workorder_merge.groupby(['Name_cat', 'Name_sub'])['OrderQty']
-        .sum()
-        .reset_index()
-        .rename(columns={'Name_cat': 'Category', 'Name_sub': 'SubCategory', 'OrderQty': 'TotalProducedQty'})
-    )
+@uses_tables(
+    ProductDimension=None,
+    SalesOrderDetail=['ProductID', 'OrderQty'],
+    WorkOrder=['ProductID', 'OrderQty'],
+)
+def aggregate_top_subcategories_by_sales_and_production(dataframes):
+    # Sales and production per subcategory, shared with the production ranking
+    combined_summary = subcategory_sales_and_production(dataframes)
+    return combined_summary.sort_values('TotalSalesQty', ascending=False).head(10)
 
-    # Merge summaries
-    combined_summary = pd.merge(sales_summary, production_summary, on=['Category', 'SubCategory'], how='outer').fillna(0)
-    combined_summary.sort_values('TotalSalesQty', ascending=False, inplace=True)
-    top10 = combined_summary.head(10)
 
+@aggregated_by(aggregate_top_subcategories_by_sales_and_production)
+def plot_top_subcategories_by_sales_and_production(top10):
     # Plotting
     plt.figure(figsize=(14, 6))
     sns.barplot(data=top10, x='TotalSalesQty', y='SubCategory', hue='Category')
@@ -712,46 +736,19 @@ def plot_top_subcategories_by_sales_and_production(dataframes):
 
 
 
-def plot_top_subcategories_by_production(dataframes):
-    # Load tables
-    product = dataframes['Product']
-    subcategory = dataframes['ProductSubcategory']
-    category = dataframes['ProductCategory']
-    sales = dataframes['SalesOrderDetail']
-    workorder = dataframes['WorkOrder']
-
-    # Ensure numeric keys for safe merging
-    product['ProductSubcategoryID'] = pd.to_numeric(product['ProductSubcategoryID'], errors='coerce')
-    subcategory['ProductCategoryID'] = pd.to_numeric(subcategory['ProductCategoryID'], errors='coerce')
-
-    # Merge Product → Subcategory → Category
-    prod_sub = pd.merge(product, subcategory, on='ProductSubcategoryID', how='left', suffixes=('', '_sub'))
-    prod_sub_cat = pd.merge(prod_sub, category, on='ProductCategoryID', how='left', suffixes=('', '_cat'))
-
-    # Merge with SalesOrderDetail and WorkOrder
-    sales_merge = pd.merge(sales, prod_sub_cat[['ProductID', 'Name_sub', 'Name_cat']], on='ProductID', how='left')
-    workorder_merge = pd.merge(workorder, prod_sub_cat[['ProductID', 'Name_sub', 'Name_cat']], on='ProductID', how='left')
-
-    # Aggregate sales and production
-    sales_summary = (
-        sales_merge.groupby(['Name_cat', 'Name_sub'])['OrderQty']
-        .sum()
-        .reset_index()
-        .rename(columns={'Name_cat': 'Category', 'Name_sub': 'SubCategory', 'OrderQty': 'TotalSalesQty'})
-    )
-
-    production_summary = (
-        workorder_merge.groupby(['Name_cat', 'Name_sub'])['OrderQty']
-        .sum()
-        .reset_index()
-        .rename(columns={'Name_cat': 'Category', 'Name_sub': 'SubCategory', 'OrderQty': 'TotalProducedQty'})
-    )
+@uses_tables(
+    ProductDimension=None,
+    SalesOrderDetail=['ProductID', 'OrderQty'],
+    WorkOrder=['ProductID', 'OrderQty'],
+)
+def aggregate_top_subcategories_by_production(dataframes):
+    # Sales and production per subcategory, shared with the sales ranking
+    combined_summary = subcategory_sales_and_production(dataframes)
+    return combined_summary.sort_values('TotalProducedQty', ascending=False).head(10)
 
-    # Merge summaries
-    combined_summary = pd.merge(sales_summary, production_summary, on=['Category', 'SubCategory'], how='outer').fillna(0)
-    combined_summary.sort_values('TotalProducedQty', ascending=False, inplace=True)
-    top10 = combined_summary.head(10)
 
+@aggregated_by(aggregate_top_subcategories_by_production)
+def plot_top_subcategories_by_production(top10):
     # Plotting
     plt.figure(figsize=(14, 6))
     sns.barplot(data=top10, x='TotalProducedQty', y='SubCategory', hue='Category')
@@ -766,53 +763,38 @@ def plot_top_subcategories_by_production(dataframes):
 
 
 
-def plot_inventory_delay_correlation(dataframes):
-    # Load necessary tables
-    product = dataframes['Product']
-    inventory = dataframes['ProductInventory']
-    sales = dataframes['SalesOrderDetail']
-    workorder = dataframes['WorkOrder']
-    routing = dataframes['WorkOrderRouting']
-
+@uses_tables(
+    ProductFacts=None,
+    ProductDimension=None,
+    InventoryDelayMoments=None,
+)
+def aggregate_inventory_delay_correlation(dataframes):
     # =====================
-    # Step 1: Aggregate Inventory by Product
+    # Step 1: Per-product Inventory, Sales and Routing Delay
     # =====================
-    inventory_summary = inventory.groupby('ProductID')['Quantity'].sum().reset_index()
-    inventory_summary.rename(columns={'Quantity': 'InventoryQty'}, inplace=True)
+    combined = dataframes['ProductFacts'][['ProductID', 'InventoryQty', 'SalesQty', 'AvgDelayDays']]
+    combined = combined.rename(columns={'SalesQty': 'TotalSalesQty'})
+    combined = combined.join(dataframes['ProductDimension']['ProductName'].rename('Name'), on='ProductID')
 
-    # =====================
-    # Step 2: Aggregate Sales by Product
-    # =====================
-    sales_summary = sales.groupby('ProductID')['OrderQty'].sum().reset_index()
-    sales_summary.rename(columns={'OrderQty': 'TotalSalesQty'}, inplace=True)
+    # Drop incomplete data
+    combined = combined.dropna(subset=['InventoryQty', 'TotalSalesQty', 'AvgDelayDays'])
 
     # =====================
-    # Step 3: Compute Delay per Work Order
+    # Step 2: Correlation Matrix, from the per-subcategory moment accumulators
     # =====================
-    workorder_routing = routing.copy()
-    workorder_routing['ScheduledEndDate'] = pd.to_datetime(workorder_routing['ScheduledEndDate'], errors='coerce')
-    workorder_routing['ActualEndDate'] = pd.to_datetime(workorder_routing['ActualEndDate'], errors='coerce')
-
-    # Calculate delay in days
-    workorder_routing['Delay'] = (workorder_routing['ActualEndDate'] - workorder_routing['ScheduledEndDate']).dt.days
-    delay_summary = workorder_routing.groupby('ProductID')['Delay'].mean().reset_index()
-    delay_summary.rename(columns={'Delay': 'AvgDelayDays'}, inplace=True)
+    corr_cols = ['InventoryQty', 'TotalSalesQty', 'AvgDelayDays']
+    corr = Moments.from_partitions(corr_cols, dataframes['InventoryDelayMoments']).corr()
+    return corr, combined
 
-    # =====================
-    # Step 4: Merge All Summaries
-    # =====================
-    combined = product[['ProductID', 'Name']].merge(inventory_summary, on='ProductID', how='left')
-    combined = combined.merge(sales_summary, on='ProductID', how='left')
-    combined = combined.merge(delay_summary, on='ProductID', how='left')
 
-    # Drop incomplete data
-    combined.dropna(subset=['InventoryQty', 'TotalSalesQty', 'AvgDelayDays'], inplace=True)
+@aggregated_by(aggregate_inventory_delay_correlation)
+def plot_inventory_delay_correlation(aggregate):
+    corr, combined = aggregate
 
     # =====================
-    # Step 5: Correlation Heatmap
+    # Step 3: Correlation Heatmap
     # =====================
     st.subheader("📊 Correlation: Inventory, Sales & Delays")
-    corr = combined[['InventoryQty', 'TotalSalesQty', 'AvgDelayDays']].corr()
 
     fig1, ax1 = plt.subplots(figsize=(8, 6))
     sns.heatmap(corr, annot=True, cmap='coolwarm', fmt=".2f", ax=ax1)
@@ -820,7 +802,7 @@ def plot_inventory_delay_correlation(dataframes):
     st.pyplot(fig1)
 
     # =====================
-    # Step 6: Scatter Plot
+    # Step 4: Scatter Plot
     # =====================
     st.subheader("📉 Inventory vs Production Delay (Sales Spike as Size)")
     fig2, ax2 = plt.subplots(figsize=(10, 6))
@@ -842,43 +824,36 @@ def plot_inventory_delay_correlation(dataframes):
 
 
 
-def plot_stock_shortages_vs_overstock(dataframes):
-    # Load tables
-    product = dataframes['Product']
-    product_inventory = dataframes['ProductInventory']
-    sales_detail = dataframes['SalesOrderDetail']
-    work_order = dataframes['WorkOrder']
-
-    # --- Total Inventory Quantity per Product ---
-    inventory_qty = product_inventory.groupby('ProductID')['Quantity'].sum().reset_index()
-    inventory_qty.rename(columns={'Quantity': 'InventoryQty'}, inplace=True)
-
-    # --- Total Sales Order Quantity per Product ---
-    sales_qty = sales_detail.groupby('ProductID')['OrderQty'].sum().reset_index()
-    sales_qty.rename(columns={'OrderQty': 'SalesQty'}, inplace=True)
-
-    # --- Total Work Order Quantity per Product ---
-    prod_qty = work_order.groupby('ProductID')['OrderQty'].sum().reset_index()
-    prod_qty.rename(columns={'OrderQty': 'ProducedQty'}, inplace=True)
-
-    # --- Merge all ---
-    df = product[['ProductID', 'Name']].merge(inventory_qty, on='ProductID', how='left') \
-                                       .merge(sales_qty, on='ProductID', how='left') \
-                                       .merge(prod_qty, on='ProductID', how='left')
-    df.fillna(0, inplace=True)
+@uses_tables(
+    ProductFacts=None,
+    ProductDimension=None,
+)
+def aggregate_stock_shortages_vs_overstock(dataframes):
+    # --- Inventory, Sales and Work Order Quantity per Product ---
+    df = dataframes['ProductFacts'][['ProductID', 'InventoryQty', 'SalesQty', 'ProducedQty']].fillna(0)
+    df = df.join(dataframes['ProductDimension']['ProductName'].rename('Name'), on='ProductID')
 
     # --- Add Mismatch Columns ---
     df['Stock_Shortage'] = df['SalesQty'] - df['InventoryQty']
     df['Overstock'] = df['InventoryQty'] - df['SalesQty']
 
     # --- View sample mismatches ---
-    df_mismatch = df[(df['Stock_Shortage'] > 0) | (df['Overstock'] > 0)].copy()
+    df_mismatch = df[(df['Stock_Shortage'] > 0) | (df['Overstock'] > 0)]
+
+    # --- Top 20 of each ---
+    top_shortage = df_mismatch.sort_values('Stock_Shortage', ascending=False).head(20)
+    top_overstock = df_mismatch.sort_values('Overstock', ascending=False).head(20)
+    return top_shortage, top_overstock
+
+
+@aggregated_by(aggregate_stock_shortages_vs_overstock)
+def plot_stock_shortages_vs_overstock(aggregate):
+    top_shortage, top_overstock = aggregate
 
     # =============================
     # 🔴 Top 20 Products with Stock Shortages
     # =============================
     st.subheader("🔴 Top 20 Products with Inventory Shortages")
-    top_shortage = df_mismatch.sort_values('Stock_Shortage', ascending=False).head(20)
 
     fig1, ax1 = plt.subplots(figsize=(10, 8))
     sns.barplot(data=top_shortage, x='Name', y='Stock_Shortage', color='red', ax=ax1)
@@ -892,7 +867,6 @@ def plot_stock_shortages_vs_overstock(dataframes):
     # 🟢 Top 20 Products with Overstock
     # =============================
     st.subheader("🟢 Top 20 Products with Overstock")
-    top_overstock = df_mismatch.sort_values('Overstock', ascending=False).head(20)
 
     fig2, ax2 = plt.subplots(figsize=(10, 8))
     sns.barplot(data=top_overstock, x='Name', y='Overstock', color='green', ax=ax2)
@@ -906,82 +880,41 @@ def plot_stock_shortages_vs_overstock(dataframes):
 
 
 
-def plot_inventory_production_delay_correlation(dataframes):
-    # Load tables
-    product = dataframes['Product']
-    inventory = dataframes['ProductInventory']
-    sales = dataframes['SalesOrderDetail']
-    work_order = dataframes['WorkOrder']
-
-    # --- Total Inventory Quantity per Product ---
-    inventory_qty = inventory.groupby('ProductID')['Quantity'].sum().reset_index()
-    inventory_qty.rename(columns={'Quantity': 'InventoryQty'}, inplace=True)
-
-    # --- Total Sales Order Quantity per Product ---
-    sales_qty = sales.groupby('ProductID')['OrderQty'].sum().reset_index()
-    sales_qty.rename(columns={'OrderQty': 'SalesQty'}, inplace=True)
-
-    # --- Total Work Order Quantity per Product ---
-    prod_qty = work_order.groupby('ProductID')['OrderQty'].sum().reset_index()
-    prod_qty.rename(columns={'OrderQty': 'ProducedQty'}, inplace=True)
-
-    # --- Merge all ---
-    df = product[['ProductID', 'Name']].merge(inventory_qty, on='ProductID', how='left') \
-                                       .merge(sales_qty, on='ProductID', how='left') \
-                                       .merge(prod_qty, on='ProductID', how='left')
-    df.fillna(0, inplace=True)
-
-    # --- Calculate Stock Shortage ---
-    df['Stock_Shortage'] = df['SalesQty'] - df['InventoryQty']
-
-    # --- Calculate delay in days (EndDate vs DueDate) ---
-    work_order['StartDate'] = pd.to_datetime(work_order['StartDate'])
-    work_order['EndDate'] = pd.to_datetime(work_order['EndDate'])
-    work_order['DueDate'] = pd.to_datetime(work_order['DueDate'])
-    work_order['ProductionDelayDays'] = (work_order['EndDate'] - work_order['DueDate']).dt.days
-
-    # --- Average Delay per Product ---
-    delay_summary = work_order.groupby('ProductID')['ProductionDelayDays'].mean().reset_index()
+@uses_tables(
+    ProductFacts=None,
+    ProductDimension=None,
+    ProductionDelayMoments=None,
+)
+def aggregate_inventory_production_delay_correlation(dataframes):
+    # --- Correlation Matrix of Inventory, Sales, Production, Shortage and Delay ---
+    # Read off the per-subcategory moment accumulators; the product facts are declared so page
+    # filters can rebuild the accumulators from filtered facts
+    corr_cols = ['InventoryQty', 'SalesQty', 'ProducedQty', 'Stock_Shortage', 'ProductionDelayDays']
+    return Moments.from_partitions(corr_cols, dataframes['ProductionDelayMoments']).corr()
 
-    # --- Merge delay info ---
-    df_delay = df.merge(delay_summary, on='ProductID', how='left')
-    df_delay.dropna(subset=['ProductionDelayDays'], inplace=True)
 
-    # --- Correlation Matrix ---
+@aggregated_by(aggregate_inventory_production_delay_correlation)
+def plot_inventory_production_delay_correlation(corr):
     st.subheader("📊 Correlation: Inventory, Sales, Production, Shortage, and Delays")
-    corr_cols = ['InventoryQty', 'SalesQty', 'ProducedQty', 'Stock_Shortage', 'ProductionDelayDays']
 
     fig, ax = plt.subplots(figsize=(8, 6))
-    sns.heatmap(df_delay[corr_cols].corr(), annot=True, cmap='coolwarm', fmt=".2f", ax=ax)
+    sns.heatmap(corr, annot=True, cmap='coolwarm', fmt=".2f", ax=ax)
     ax.set_title("Correlation Matrix: Inventory, Sales, and Delays")
     st.pyplot(fig)
 
 
 
-def plot_seasonal_inventory_vs_production(dataframes):
-    # Load relevant tables
-    product_inventory = dataframes['ProductInventory'].copy()
-    work_order = dataframes['WorkOrder'].copy()
-
-    # Convert dates
-    product_inventory['ModifiedDate'] = pd.to_datetime(product_inventory['ModifiedDate'])
-    work_order['StartDate'] = pd.to_datetime(work_order['StartDate'])
-
-    # Monthly Inventory Quantity
-    inv_monthly = (
-        product_inventory.groupby(product_inventory['ModifiedDate'].dt.to_period('M'))['Quantity']
-        .sum()
-        .reset_index()
-    )
-    inv_monthly['Month'] = inv_monthly['ModifiedDate'].dt.to_timestamp()
-
-    # Monthly Production Quantity
-    prod_monthly = (
-        work_order.groupby(work_order['StartDate'].dt.to_period('M'))['OrderQty']
-        .sum()
-        .reset_index()
-    )
-    prod_monthly['Month'] = prod_monthly['StartDate'].dt.to_timestamp()
+@uses_tables(
+    InventoryMonthly=None,
+    ProductionMonthly=None,
+    InventorySeasonality=None,
+    ProductDimension=['ProductName'],
+    Location=['LocationID', 'Name'],
+)
+def aggregate_seasonal_inventory_vs_production(dataframes):
+    # Monthly Inventory and Production Quantity from the rollups
+    inv_monthly = dataframes['InventoryMonthly'].groupby('Month')['Quantity'].sum().reset_index()
+    prod_monthly = dataframes['ProductionMonthly'].groupby('Month')['OrderQty'].sum().reset_index()
 
     # Merge for visualization
     seasonal_df = pd.merge(
@@ -991,6 +924,24 @@ def plot_seasonal_inventory_vs_production(dataframes):
         how='outer'
     ).fillna(0)
 
+    # The total inventory series decomposes to the sum of its product/location components
+    seasonality = dataframes['InventorySeasonality']
+    components = seasonality.groupby('Month')[['Observed', 'Trend', 'Seasonal', 'Resid']].sum(min_count=1)
+
+    # Product/location series with the strongest seasonal component
+    strongest = (
+        seasonality.drop_duplicates(['ProductID', 'LocationID'])
+        .nlargest(10, 'SeasonalStrength')[['ProductID', 'LocationID', 'SeasonalStrength']]
+    )
+    strongest.insert(0, 'Product', strongest['ProductID'].map(dataframes['ProductDimension']['ProductName']))
+    strongest.insert(1, 'Location', strongest['LocationID'].map(dataframes['Location'].set_index('LocationID')['Name']))
+    return seasonal_df, components, strongest.drop(columns=['ProductID', 'LocationID']).reset_index(drop=True)
+
+
+@aggregated_by(aggregate_seasonal_inventory_vs_production)
+def plot_seasonal_inventory_vs_production(aggregate):
+    seasonal_df, components, strongest = aggregate
+
     # --- Plot Inventory vs Production Over Time ---
     st.subheader("📅 Seasonal Pattern: Inventory vs Production Over Time")
     fig, ax = plt.subplots(figsize=(14, 6))
@@ -1006,31 +957,41 @@ def plot_seasonal_inventory_vs_production(dataframes):
     # --- Time Series Decomposition for Inventory ---
     st.subheader("📈 Inventory Seasonality Decomposition")
 
-    series = inv_monthly.set_index('Month')['Quantity'].asfreq('MS').fillna(0)
+    if components.empty:
+        st.warning("Time series decomposition needs at least two full years of monthly inventory.")
+        return
 
-    try:
-        result = seasonal_decompose(series, model='additive')
-        fig2 = result.plot()
-        fig2.set_size_inches(12, 8)
-        st.pyplot(fig2)
-    except Exception as e:
-        st.warning(f"Time series decomposition failed: {e}")
+    fig2, axes = plt.subplots(4, 1, figsize=(12, 8), sharex=True)
+    for ax, column in zip(axes, components.columns):
+        if column == 'Resid':
+            ax.plot(components.index, components[column], marker='o', linestyle='none')
+            ax.axhline(0, color='black', linewidth=0.8)
+        else:
+            ax.plot(components.index, components[column])
+        ax.set_ylabel(column)
+    fig2.tight_layout()
+    st.pyplot(fig2)
+
+    st.subheader("🔁 Most Seasonal Product/Location Series")
+    st.dataframe(strongest.round({'SeasonalStrength': 2}), use_container_width=True)
 
 
 
 
-def plot_sales_by_territory(dataframes):
+@uses_period(SalesOrderHeader=FY2014)
+@uses_tables(
+    SalesOrderHeader=['OrderDate', 'TerritoryID', 'TotalDue'],
+    SalesTerritory=['TerritoryID', 'Name'],
+)
+def aggregate_sales_by_territory(dataframes):
     # Load tables
-    sales_order_header = dataframes['SalesOrderHeader'].copy()
+    sales_order_header = dataframes['SalesOrderHeader']
     sales_territory = dataframes.get('SalesTerritory')  # Optional
 
-    # Convert dates
-    sales_order_header['OrderDate'] = pd.to_datetime(sales_order_header['OrderDate'])
-
-    # Filter for FY 2014 (July 2013 - June 2014)
+    # Filter for FY 2014 (July 2013 - June 2014); with date partitions only those months are loaded
     filtered_sales = sales_order_header[
-        (sales_order_header['OrderDate'] >= '2013-07-01') &
-        (sales_order_header['OrderDate'] <= '2014-06-30')
+        (sales_order_header['OrderDate'] >= FY2014[0]) &
+        (sales_order_header['OrderDate'] <= FY2014[1])
     ]
 
     # Group by TerritoryID
@@ -1052,7 +1013,11 @@ def plot_sales_by_territory(dataframes):
         sales_by_territory['Region'] = sales_by_territory['Name'].fillna('Unknown')
     else:
         sales_by_territory['Region'] = sales_by_territory['TerritoryID'].fillna('Unknown')
+    return sales_by_territory
 
+
+@aggregated_by(aggregate_sales_by_territory)
+def plot_sales_by_territory(sales_by_territory):
     # Plotting
     st.subheader("🗺️ Total Sales by Territory (Jul 2013 - Jun 2014)")
     fig, ax = plt.subplots(figsize=(12, 6))
@@ -1066,23 +1031,21 @@ def plot_sales_by_territory(dataframes):
     st.pyplot(fig)
 
 
-def plot_us_region_sales(conn):
-    # Step 1: Load SalesTerritory data
-    sales_territory_df = pd.read_sql("SELECT * FROM Sales.SalesTerritory", conn)
-
-    # Step 2: Filter for US Region only
-    us_sales = sales_territory_df[sales_territory_df['CountryRegionCode'] == 'US'].copy()
-    us_sales['Sales_YTD'] = us_sales['SalesYTD'].round(2)
-    us_sales['Sales_LastYear'] = us_sales['SalesLastYear'].round(2)
+@uses_tables()
+def plot_us_region_sales(us_sales):
+    # Step 1: Rows arrive filtered to the US and sorted by the query
+    us_sales = us_sales.assign(
+        Sales_YTD=us_sales['SalesYTD'].round(2),
+        Sales_LastYear=us_sales['SalesLastYear'].round(2)
+    )
 
-    # Sort and convert YTD sales to Lakhs (i.e., 1 Lakh = 100,000)
-    us_sales_sorted = us_sales.sort_values(by='Sales_YTD', ascending=False)
-    us_sales_sorted['Sales_YTD_Lakhs'] = (us_sales_sorted['Sales_YTD'] / 1e5).round(2)
+    # Step 2: Convert YTD sales to Lakhs (i.e., 1 Lakh = 100,000)
+    us_sales = us_sales.assign(Sales_YTD_Lakhs=(us_sales['Sales_YTD'] / 1e5).round(2))
 
     # Step 3: Visualization
     st.subheader("📊 Sales by US Region (in Lakhs)")
     fig, ax = plt.subplots(figsize=(12, 6))
-    sns.barplot(data=us_sales_sorted, x='Name', y='Sales_YTD_Lakhs', palette='coolwarm', ax=ax)
+    sns.barplot(data=us_sales, x='Name', y='Sales_YTD_Lakhs', palette='coolwarm', ax=ax)
 
     ax.set_title("📊 Sales by US Region (in Lakhs)", fontsize=16)
     ax.set_xlabel("Region Name")
@@ -1098,26 +1061,17 @@ def plot_us_region_sales(conn):
 
 
 
-def plot_sales_by_country(sales_territory_df):
-
-
-    # Step 1: Group by Country and aggregate sales
-    country_sales = (
-        sales_territory_df
-        .groupby('CountryRegionCode', as_index=False)[['SalesYTD', 'SalesLastYear']]
-        .sum()
+@uses_tables()
+def plot_sales_by_country(country_sales):
+    # Step 1: Rows arrive grouped by country and sorted by the query; convert to Lakhs
+    country_sales = country_sales.assign(
+        Sales_YTD_Lakhs=(country_sales['SalesYTD'] / 1e5).round(2),
+        Sales_LastYear_Lakhs=(country_sales['SalesLastYear'] / 1e5).round(2)
     )
 
-    # Step 2: Convert to Lakhs
-    country_sales['Sales_YTD_Lakhs'] = (country_sales['SalesYTD'] / 1e5).round(2)
-    country_sales['Sales_LastYear_Lakhs'] = (country_sales['SalesLastYear'] / 1e5).round(2)
-
-    # Step 3: Sort by Sales_YTD_Lakhs
-    country_sales_sorted = country_sales.sort_values(by='Sales_YTD_Lakhs', ascending=False)
-
-    # Step 4: Plot
+    # Step 2: Plot
     fig, ax = plt.subplots(figsize=(10, 6))
-    sns.barplot(data=country_sales_sorted, x='CountryRegionCode', y='Sales_YTD_Lakhs', palette='viridis', ax=ax)
+    sns.barplot(data=country_sales, x='CountryRegionCode', y='Sales_YTD_Lakhs', palette='viridis', ax=ax)
 
     ax.set_title("🌍 Sales by Country (YTD in Lakhs)", fontsize=16)
     ax.set_xlabel("Country Code")
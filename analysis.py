@@ -2,7 +2,6 @@
 import os
 import streamlit as st
 import pandas as pd
-import pyodbc
 import matplotlib.pyplot as plt
 import seaborn as sns
 from datetime import datetime
@@ -12,14 +11,30 @@ import scipy.stats as stats
 from streamlit_lottie import st_lottie
 import requests
 import time
+from concurrent.futures import ThreadPoolExecutor
 
+from aggregate_cache import AggregateCache
+from data_loader import FilteredTables, TableStore, chart_periods, chart_tables, merge_requirements
+from model import (
+    CORRELATION_MOMENTS, DEMAND_FORECAST, INVENTORY_CUBE, PRODUCT_DIMENSION, PRODUCT_FACTS, PRODUCTION_MONTHLY,
+    SUPPLIER_SALES_SKETCH, build_moments, register_models
+)
+from filters import KEY_TABLES, FilterEngine
+from pipeline import evaluation, step_report
+from sketches import APPROX_TOP_K
+from db import (
+    ConnectionPool, PoolExhausted, QueryExecutor, QueryTimeout,
+    country_sales, sqlserver_connect, us_region_sales
+)
 from VisualizationofallAnalysis import (
     plot_inventory_quantity,
     plot_demand_vs_supply,
     plot_inventory_value_by_category,
     plot_space_utilization_by_category_location,
+    plot_inventory_comparison,
     plot_lead_time_by_category,
     plot_top_suppliers_by_sales_value,
+    plot_top_suppliers_approx,
     plot_inventory_vs_safety_stock,
     plot_top_products_by_inventory_quantity,
     plot_fill_rate_by_product_category,
@@ -41,20 +56,140 @@ from VisualizationofallAnalysis import (
 
 st.set_page_config(page_title="📊 Inventory Analysis Dashboard", layout="wide")
 
-@st.cache_data
-def load_csv_data(input_dir):
-    dataframes = {}
-    for filename in os.listdir(input_dir):
-        if filename.endswith('.csv'):
-            table_name = filename.replace('.csv', '')
-            try:
-                df = pd.read_csv(os.path.join(input_dir, filename))
-                if 'ProductID' in df.columns:
-                    df['ProductID'] = df['ProductID'].astype(str)
-                dataframes[table_name] = df
-            except Exception:
-                pass
-    return dataframes
+# Tables every page needs for the sidebar stats and filter dropdowns
+BASE_TABLES = {
+    'Product': ['ProductID', 'Name', 'ProductSubcategoryID'],
+    'ProductInventory': None,
+    'ProductSubcategory': ['ProductSubcategoryID', 'ProductCategoryID', 'Name'],
+    'ProductCategory': ['ProductCategoryID', 'Name'],
+    'Location': ['LocationID', 'Name'],
+}
+
+@st.cache_resource
+def get_table_store(input_dir):
+    table_store = TableStore(input_dir)
+    register_models(table_store)
+    return table_store
+
+@st.cache_resource
+def get_filter_engine(input_dir):
+    return FilterEngine(get_table_store(input_dir))
+
+@st.cache_resource
+def get_query_executor():
+    # One bounded pool for every session; connections are opened lazily
+    return QueryExecutor(ConnectionPool(sqlserver_connect()))
+
+@st.cache_resource
+def get_aggregate_cache():
+    return AggregateCache()
+
+@st.cache_resource
+def get_aggregate_workers():
+    # Exact aggregates of previewed charts run here while the script draws the preview
+    return ThreadPoolExecutor(thread_name_prefix='aggregate')
+
+def show_chart(plot_fn, filter_key, *args, **kwargs):
+    # Aggregates are reused across reruns and sessions until the chart's tables or the page filter change
+    if not hasattr(plot_fn, 'aggregate'):
+        return plot_fn(*args, **kwargs)
+    key = (plot_fn.__name__, table_store.data_version(chart_tables(plot_fn)), filter_key)
+    cache = get_aggregate_cache()
+
+    def compute():
+        # Shared analysis steps are reused by every chart on the page with the same filter
+        with evaluation(table_store, cache, (page, filter_key)):
+            return cache.get(key, lambda: plot_fn.aggregate(*args, **kwargs))
+
+    if hasattr(plot_fn.aggregate, 'preview') and key not in cache:
+        # The exact aggregate starts on a worker first; the sampled preview is drawn while it runs
+        # and swapped out once it lands
+        exact = get_aggregate_workers().submit(compute)
+        preview_slot = st.empty()
+        preview = plot_fn.aggregate.preview(*args, **kwargs)
+        if preview is not None and not exact.done():
+            with preview_slot.container():
+                plot_fn(preview)
+        aggregate = exact.result()
+        preview_slot.empty()
+    else:
+        aggregate = compute()
+    plot_fn(aggregate)
+
+def run_query(query_fn):
+    try:
+        with st.spinner("Querying database..."):
+            return query_fn(get_query_executor())
+    except QueryTimeout as e:
+        st.error(f"⏳ The database is taking too long to respond. {e}")
+    except PoolExhausted as e:
+        st.error(f"🚦 The database is busy, please try again shortly. {e}")
+    except Exception as e:
+        st.error(f"❌ Database query failed: {e}")
+    return None
+
+def chart_requirements(plot_fn):
+    tables = chart_tables(plot_fn)
+    # Filter columns ride along so page filters still reach every table the chart reads, each
+    # table getting only the keys and filtered columns it carries
+    filter_columns = {}
+    for column, table_names in KEY_TABLES.items():
+        for name in table_names:
+            if name in tables:
+                filter_columns.setdefault(name, []).append(column)
+    for name, columns in FILTER_COLUMNS.items():
+        if name in tables:
+            filter_columns.setdefault(name, []).extend(columns)
+    return merge_requirements(BASE_TABLES, tables, filter_columns)
+
+# Inventory charts that can be compared side by side: the cube level they show, their measure and top-N
+COMPARISON_VIEWS = {
+    plot_inventory_quantity: ('CategoryName', 'Quantity', None),
+    plot_top_products_by_inventory_quantity: ('ProductName', 'Quantity', 10),
+    plot_inventory_by_subcategory: ('SubcategoryName', 'Quantity', None),
+    plot_inventory_value_by_category: ('CategoryName', 'InventoryValue', None),
+}
+
+# Cube column each comparison dimension splits on
+COMPARE_DIMENSIONS = {
+    'Location': 'LocationName',
+    'Product Category': 'CategoryName',
+    'Product Subcategory': 'SubcategoryName',
+}
+
+# Columns the row-level page filters read, per source table
+FILTER_COLUMNS = {'WorkOrder': ['ScrappedQty'], 'WorkOrderRouting': ['LocationID'], 'ProductInventory': ['LocationID']}
+
+def filtered_derived(table_store, name, location_ids=None, scrap_qty_threshold=None):
+    # Row-level filters change a derived table's measures, so the shared table is rebuilt from filtered rows
+    requirements, build = table_store.derivation(name)
+
+    def rebuild():
+        sources = FilteredTables(table_store.require(merge_requirements(
+            requirements, {table: columns for table, columns in FILTER_COLUMNS.items() if table in requirements}
+        )))
+        if location_ids is not None:
+            filters.select(sources, 'LocationID', location_ids)
+        if scrap_qty_threshold is not None:
+            sources.where('ScrappedQty', lambda qty: qty >= scrap_qty_threshold, ['WorkOrder'])
+        return build(sources)
+
+    key = (
+        name, table_store.data_version(requirements),
+        None if location_ids is None else tuple(location_ids), scrap_qty_threshold
+    )
+    return get_aggregate_cache().get(key, rebuild)
+
+def slice_moments(filtered_dataframes, filter_type, selected_filter_value):
+    # Correlation moments are kept per subcategory: a subcategory filter keeps its partition, while any
+    # other filter changes the product facts underneath, so those are accumulated from the filtered facts
+    for name in CORRELATION_MOMENTS:
+        if name not in filtered_dataframes or filter_type == "None":
+            continue
+        if filter_type == "Subcategory":
+            filters.select(filtered_dataframes, 'ProductSubcategoryID', filters.subcategory_ids(selected_filter_value), [name])
+        else:
+            filtered_dataframes.replace(name, build_moments(name)(filtered_dataframes))
 
 def show_login():
     def load_lottieurl(url):
@@ -152,7 +287,10 @@ with st.sidebar:
 
 # ---------- Main App ----------
 input_dir = 'output_csvs'
-dataframes = load_csv_data(input_dir)
+table_store = get_table_store(input_dir)
+filters = get_filter_engine(input_dir)
+refreshed_tables = table_store.refresh()
+dataframes = table_store.require(BASE_TABLES)
 
 inventory_df = dataframes.get('ProductInventory')
 product_df = dataframes.get('Product')
@@ -222,60 +360,92 @@ if page == "📦 Inventory & Stock Insights":
             "Product Name",
             "Location"
         ))
+        kpi_value = None
+        kpi_selection = None
         if metric_filter == "Product Category":
-            cat = st.selectbox("Select Product Category:", category_df['Name'].unique())
-            product_ids = subcategory_df[subcategory_df['ProductCategoryID'] == category_df[category_df['Name'] == cat]['ProductCategoryID'].values[0]]['ProductSubcategoryID'].values
-            inventory_df = inventory_df[inventory_df['ProductID'].isin(product_df[product_df['ProductSubcategoryID'].isin(product_ids)]['ProductID'])]
+            kpi_value = st.selectbox("Select Product Category:", category_df['Name'].unique())
+            kpi_selection = ('ProductID', filters.product_ids('Category', kpi_value))
         elif metric_filter == "Product Subcategory":
-            subcat = st.selectbox("Select Product Subcategory:", subcategory_df['Name'].unique())
-            subcat_id = subcategory_df[subcategory_df['Name'] == subcat]['ProductSubcategoryID'].values[0]
-            inventory_df = inventory_df[inventory_df['ProductID'].isin(product_df[product_df['ProductSubcategoryID'] == subcat_id]['ProductID'])]
+            kpi_value = st.selectbox("Select Product Subcategory:", subcategory_df['Name'].unique())
+            kpi_selection = ('ProductID', filters.product_ids('Subcategory', kpi_value))
         elif metric_filter == "Product Name":
-            pname = st.selectbox("Select Product Name:", product_df['Name'].unique())
-            inventory_df = inventory_df[inventory_df['ProductID'].isin(product_df[product_df['Name'] == pname]['ProductID'])]
+            kpi_value = st.selectbox("Select Product Name:", product_df['Name'].unique())
+            kpi_selection = ('ProductID', filters.product_ids('Product', kpi_value))
         elif metric_filter == "Location":
-            loc = st.selectbox("Select Location:", location_df['Name'].unique())
-            inventory_df = inventory_df[inventory_df['LocationID'].isin(location_df[location_df['Name'] == loc]['LocationID'])]
+            kpi_value = st.selectbox("Select Location:", location_df['Name'].unique())
+            kpi_selection = ('LocationID', filters.location_ids(kpi_value))
 
     if st.button("🔄 Reset Filters"):
         st.rerun()
 
-    chart_option = st.selectbox("📊 Select an analysis to visualize:", (
-        "📉 Inventory Quantity by Product Category",
-        "🛡️ Actual Inventory vs Safety Stock Level",
-        "🏷️ Top 10 Products by Actual Inventory Quantity",
-        "📊 Inventory Quantity by Product Subcategory",
-        "📜 Warehouse Space Utilization by Product Category and Location",
-        "⚖️ Inventory Mismatches: Stock Shortages vs Overstock",
-        "💰 Inventory Value by Product Category"
-    ))
+    page_charts = {
+        "📉 Inventory Quantity by Product Category": plot_inventory_quantity,
+        "🛡️ Actual Inventory vs Safety Stock Level": plot_inventory_vs_safety_stock,
+        "🏷️ Top 10 Products by Actual Inventory Quantity": plot_top_products_by_inventory_quantity,
+        "📊 Inventory Quantity by Product Subcategory": plot_inventory_by_subcategory,
+        "📜 Warehouse Space Utilization by Product Category and Location": plot_space_utilization_by_category_location,
+        "⚖️ Inventory Mismatches: Stock Shortages vs Overstock": plot_stock_shortages_vs_overstock,
+        "💰 Inventory Value by Product Category": plot_inventory_value_by_category
+    }
+    chart_option = st.selectbox("📊 Select an analysis to visualize:", tuple(page_charts))
+    selected_chart = page_charts[chart_option]
+
+    # ---- Comparison Mode ----
+    compare_values = []
+    if selected_chart in COMPARISON_VIEWS:
+        with st.expander("🆚 Compare Side by Side"):
+            level = COMPARISON_VIEWS[selected_chart][0]
+            compare_by = st.radio(
+                "Compare across:", tuple(name for name, column in COMPARE_DIMENSIONS.items() if column != level), horizontal=True
+            )
+            compare_options = {
+                "Location": location_df,
+                "Product Category": category_df,
+                "Product Subcategory": subcategory_df
+            }[compare_by]['Name'].unique()
+            compare_values = st.multiselect(f"Select two or more values of {compare_by}:", compare_options)
     st.markdown("---")
 
-    if chart_option == "📉 Inventory Quantity by Product Category":
-        plot_inventory_quantity(inventory_df, product_df, subcategory_df, category_df)
+    # Load only what the selected chart reads; the KPI filter slices the inventory cube
+    dataframes = table_store.require(chart_requirements(selected_chart), chart_periods(selected_chart))
+    filtered_dataframes = FilteredTables(dataframes)
+    if kpi_selection is not None:
+        filters.select(filtered_dataframes, *kpi_selection, [INVENTORY_CUBE])
+    inventory_cube = filtered_dataframes.get(INVENTORY_CUBE)
+    product_df = dataframes.get('Product')
+    subcategory_df = dataframes.get('ProductSubcategory')
+    category_df = dataframes.get('ProductCategory')
+    location_df = dataframes.get('Location')
+    product_dim = dataframes.get(PRODUCT_DIMENSION)
+    filter_key = (metric_filter, kpi_value)
+
+    if len(compare_values) > 1:
+        level, measure, top = COMPARISON_VIEWS[selected_chart]
+        show_chart(
+            plot_inventory_comparison, filter_key + (compare_by, tuple(compare_values), level, measure),
+            inventory_cube, COMPARE_DIMENSIONS[compare_by], compare_values, level, measure, top
+        )
+
+    elif chart_option == "📉 Inventory Quantity by Product Category":
+        show_chart(plot_inventory_quantity, filter_key, inventory_cube)
 
     elif chart_option == "🛡️ Actual Inventory vs Safety Stock Level":
-        plot_inventory_vs_safety_stock(inventory_df, product_df)
+        show_chart(plot_inventory_vs_safety_stock, filter_key, inventory_cube, product_dim)
 
     elif chart_option == "🏷️ Top 10 Products by Actual Inventory Quantity":
-        plot_top_products_by_inventory_quantity(inventory_df, product_df)
+        show_chart(plot_top_products_by_inventory_quantity, filter_key, inventory_cube, product_dim)
 
     elif chart_option == "📊 Inventory Quantity by Product Subcategory":
-        plot_inventory_by_subcategory(dataframes)
+        show_chart(plot_inventory_by_subcategory, filter_key, {INVENTORY_CUBE: inventory_cube})
 
     elif chart_option == "📜 Warehouse Space Utilization by Product Category and Location":
-        plot_space_utilization_by_category_location(product_df, inventory_df, subcategory_df, category_df, location_df)
+        show_chart(plot_space_utilization_by_category_location, filter_key, inventory_cube)
 
     elif chart_option == "⚖️ Inventory Mismatches: Stock Shortages vs Overstock":
-        plot_stock_shortages_vs_overstock(dataframes)
+        show_chart(plot_stock_shortages_vs_overstock, filter_key, dataframes)
 
     elif chart_option == "💰 Inventory Value by Product Category":
-        plot_inventory_value_by_category({
-            "Product": product_df,
-            "ProductInventory": inventory_df,
-            "ProductSubcategory": subcategory_df,
-            "ProductCategory": category_df
-        })
+        show_chart(plot_inventory_value_by_category, filter_key, {INVENTORY_CUBE: inventory_cube})
 
 
 
@@ -309,56 +479,67 @@ elif page == "🏭 Production & Operational Efficiency":
 
     st.markdown("---")
 
+    # 📊 --- CHART SELECTION ---
+    page_charts = {
+        "📈 Top 5 Products Production Trend Over Time": plot_top_products_production_over_time,
+        "♻️ Scrap Quantity by Reason": plot_scrap_quantity_by_reason,
+        "⏱️ Lead Time Analysis by Product Category": plot_lead_time_by_category,
+        "🚚 Picking Efficiency by Product and Location": plot_picking_efficiency,
+        "📈 Correlation: Inventory, Production, Delay": plot_inventory_production_delay_correlation,
+        "📉 Seasonality Analysis of Inventory and Production": plot_seasonal_inventory_vs_production
+    }
+    chart_option = st.selectbox("⚙️ Select an analysis to visualize:", tuple(page_charts))
+    st.markdown("---")
+
+    selected_chart = page_charts[chart_option]
+    dataframes = table_store.require(chart_requirements(selected_chart), chart_periods(selected_chart))
+    product_df = dataframes.get('Product')
+    subcategory_df = dataframes.get('ProductSubcategory')
+    category_df = dataframes.get('ProductCategory')
+    location_df = dataframes.get('Location')
+
     # 🔧 Filter logic
-    filtered_dataframes = dataframes.copy()
+    filtered_dataframes = FilteredTables(dataframes)
+    production_tables = ['WorkOrder', 'WorkOrderRouting', PRODUCT_FACTS, PRODUCTION_MONTHLY]
 
     if filter_type == "Product Name" and selected_filter_value:
-        product_ids = product_df[product_df['Name'] == selected_filter_value]['ProductID'].tolist()
-        filtered_dataframes['WorkOrder'] = dataframes['WorkOrder'][dataframes['WorkOrder']['ProductID'].isin(product_ids)]
-        filtered_dataframes['WorkOrderRouting'] = dataframes['WorkOrderRouting'][dataframes['WorkOrderRouting']['ProductID'].isin(product_ids)]
+        filters.select(filtered_dataframes, 'ProductID', filters.product_ids('Product', selected_filter_value), production_tables)
 
     elif filter_type == "Location" and selected_filter_value:
-        location_ids = location_df[location_df['Name'] == selected_filter_value]['LocationID'].tolist()
-        filtered_dataframes['WorkOrderRouting'] = dataframes['WorkOrderRouting'][dataframes['WorkOrderRouting']['LocationID'].isin(location_ids)]
+        location_ids = filters.location_ids(selected_filter_value)
+        filters.select(filtered_dataframes, 'LocationID', location_ids)
+        if PRODUCT_FACTS in dataframes:
+            filtered_dataframes.replace(PRODUCT_FACTS, filtered_derived(table_store, PRODUCT_FACTS, location_ids=location_ids))
 
     elif filter_type == "Subcategory" and selected_filter_value:
-        sub_ids = subcategory_df[subcategory_df['Name'] == selected_filter_value]['ProductSubcategoryID'].astype(str).tolist()
-        filtered_products = product_df[product_df['ProductSubcategoryID'].astype(str).isin(sub_ids)]
-        filtered_dataframes['WorkOrder'] = dataframes['WorkOrder'][dataframes['WorkOrder']['ProductID'].isin(filtered_products['ProductID'])]
-        filtered_dataframes['WorkOrderRouting'] = dataframes['WorkOrderRouting'][dataframes['WorkOrderRouting']['ProductID'].isin(filtered_products['ProductID'])]
+        filters.select(filtered_dataframes, 'ProductID', filters.product_ids('Subcategory', selected_filter_value), production_tables)
 
     elif filter_type == "Scrap Quantity" and scrap_qty_threshold is not None:
-        if 'WorkOrder' in dataframes:
-            filtered_dataframes['WorkOrder'] = dataframes['WorkOrder'][dataframes['WorkOrder']['ScrappedQty'] >= scrap_qty_threshold]
+        filtered_dataframes.where('ScrappedQty', lambda qty: qty >= scrap_qty_threshold, ['WorkOrder'])
+        for name in [PRODUCT_FACTS, PRODUCTION_MONTHLY]:
+            if name in dataframes:
+                filtered_dataframes.replace(name, filtered_derived(table_store, name, scrap_qty_threshold=scrap_qty_threshold))
 
-    # 📊 --- CHART SELECTION ---
-    chart_option = st.selectbox("⚙️ Select an analysis to visualize:", (
-        "📈 Top 5 Products Production Trend Over Time",
-        "♻️ Scrap Quantity by Reason",
-        "⏱️ Lead Time Analysis by Product Category",
-        "🚚 Picking Efficiency by Product and Location",
-        "📈 Correlation: Inventory, Production, Delay",
-        "📉 Seasonality Analysis of Inventory and Production"
-    ))
-    st.markdown("---")
+    slice_moments(filtered_dataframes, filter_type, selected_filter_value)
+    filter_key = (filter_type, selected_filter_value, scrap_qty_threshold)
 
     # 📊 --- CHART VISUALIZATION ---
     if chart_option == "📈 Top 5 Products Production Trend Over Time":
-        plot_top_products_production_over_time(filtered_dataframes)
+        show_chart(plot_top_products_production_over_time, filter_key, filtered_dataframes)
 
     elif chart_option == "♻️ Scrap Quantity by Reason":
-        plot_scrap_quantity_by_reason(filtered_dataframes)
+        show_chart(plot_scrap_quantity_by_reason, filter_key, filtered_dataframes)
 
     elif chart_option == "⏱️ Lead Time Analysis by Product Category":
-        plot_lead_time_by_category(
+        show_chart(
+            plot_lead_time_by_category, filter_key,
             workorder_df=filtered_dataframes['WorkOrder'],
-            product_df=product_df,
-            product_subcategory_df=subcategory_df,
-            product_category_df=category_df
+            product_dim=dataframes[PRODUCT_DIMENSION]
         )
 
     elif chart_option == "🚚 Picking Efficiency by Product and Location":
-        plot_picking_efficiency(
+        show_chart(
+            plot_picking_efficiency, filter_key,
             work_order_routing_df=filtered_dataframes['WorkOrderRouting'],
             work_order_df=filtered_dataframes['WorkOrder'],
             product_df=product_df,
@@ -366,10 +547,10 @@ elif page == "🏭 Production & Operational Efficiency":
         )
 
     elif chart_option == "📈 Correlation: Inventory, Production, Delay":
-        plot_inventory_production_delay_correlation(filtered_dataframes)
+        show_chart(plot_inventory_production_delay_correlation, filter_key, filtered_dataframes)
 
     elif chart_option == "📉 Seasonality Analysis of Inventory and Production":
-        plot_seasonal_inventory_vs_production(filtered_dataframes)
+        show_chart(plot_seasonal_inventory_vs_production, filter_key, filtered_dataframes)
 
 
 
@@ -400,86 +581,87 @@ elif page == "💼 Sales & Supplier Performance":
         if st.button("🔄 Reset Filters"):
             st.rerun()
 
+    # 📊 CHART OPTIONS
+    page_charts = {
+        "🧾 Top Suppliers by Sales Value": plot_top_suppliers_by_sales_value,
+        "📍 Sales by Territory": plot_sales_by_territory,
+        "🇺🇸 US Region-wise Sales YTD": plot_us_region_sales,
+        "🌍 Country-wise Sales YTD": plot_sales_by_country,
+        "🔄 Demand vs Supply by Product": plot_demand_vs_supply,
+        "📦 Fill Rate by Product Category": plot_fill_rate_by_product_category
+    }
+    chart_option = st.selectbox("💹 Select an analysis to visualize:", tuple(page_charts))
+
+    # The sketch covers every order line, so it can only stand in while no product filter narrows them
+    approximate_suppliers = False
+    if chart_option == "🧾 Top Suppliers by Sales Value" and filter_type not in ("Product Name", "Subcategory"):
+        approximate_suppliers = st.checkbox("⚡ Approximate leaderboard (streaming sketch)", value=APPROX_TOP_K)
+        if approximate_suppliers:
+            page_charts[chart_option] = plot_top_suppliers_approx
+    st.markdown("---")
+
+    selected_chart = page_charts[chart_option]
+    dataframes = table_store.require(chart_requirements(selected_chart), chart_periods(selected_chart))
+    product_df = dataframes.get('Product')
+    subcategory_df = dataframes.get('ProductSubcategory')
+    location_df = dataframes.get('Location')
+
     # 🔧 Apply filters
-    filtered_dataframes = dataframes.copy()
+    filtered_dataframes = FilteredTables(dataframes)
     if filter_type == "Product Name" and selected_filter_value:
-        product_ids = product_df[product_df['Name'] == selected_filter_value]['ProductID'].tolist()
-        for key in filtered_dataframes:
-            if 'ProductID' in filtered_dataframes[key].columns:
-                filtered_dataframes[key] = filtered_dataframes[key][filtered_dataframes[key]['ProductID'].isin(product_ids)]
+        filters.select(filtered_dataframes, 'ProductID', filters.product_ids('Product', selected_filter_value))
 
     elif filter_type == "Location" and selected_filter_value:
-        location_ids = location_df[location_df['Name'] == selected_filter_value]['LocationID'].tolist()
-        if 'WorkOrderRouting' in filtered_dataframes:
-            filtered_dataframes['WorkOrderRouting'] = filtered_dataframes['WorkOrderRouting'][filtered_dataframes['WorkOrderRouting']['LocationID'].isin(location_ids)]
+        location_ids = filters.location_ids(selected_filter_value)
+        filters.select(filtered_dataframes, 'LocationID', location_ids)
 
     elif filter_type == "Subcategory" and selected_filter_value:
-        sub_ids = subcategory_df[subcategory_df['Name'] == selected_filter_value]['ProductSubcategoryID'].astype(str).tolist()
-        filtered_products = product_df[product_df['ProductSubcategoryID'].astype(str).isin(sub_ids)]
-        for key in filtered_dataframes:
-            if 'ProductID' in filtered_dataframes[key].columns:
-                filtered_dataframes[key] = filtered_dataframes[key][filtered_dataframes[key]['ProductID'].isin(filtered_products['ProductID'])]
+        filters.select(filtered_dataframes, 'ProductID', filters.product_ids('Subcategory', selected_filter_value))
 
     elif filter_type == "Scrap Quantity" and scrap_qty_threshold is not None:
-        if 'WorkOrder' in filtered_dataframes:
-            filtered_dataframes['WorkOrder'] = filtered_dataframes['WorkOrder'][filtered_dataframes['WorkOrder']['ScrappedQty'] >= scrap_qty_threshold]
+        filtered_dataframes.where('ScrappedQty', lambda qty: qty >= scrap_qty_threshold, ['WorkOrder'])
 
-    # 📊 CHART OPTIONS
-    chart_option = st.selectbox("💹 Select an analysis to visualize:", (
-        "🧾 Top Suppliers by Sales Value",
-        "📍 Sales by Territory",
-        "🇺🇸 US Region-wise Sales YTD",
-        "🌍 Country-wise Sales YTD",
-        "🔄 Demand vs Supply by Product",
-        "📦 Fill Rate by Product Category"
-    ))
-    st.markdown("---")
+    filter_key = (filter_type, selected_filter_value, scrap_qty_threshold)
 
     # 📊 VISUALIZATIONS
-    if chart_option == "🧾 Top Suppliers by Sales Value":
-        plot_top_suppliers_by_sales_value(
+    if approximate_suppliers:
+        show_chart(plot_top_suppliers_approx, filter_key, dataframes[SUPPLIER_SALES_SKETCH])
+
+    elif chart_option == "🧾 Top Suppliers by Sales Value":
+        show_chart(
+            plot_top_suppliers_by_sales_value, filter_key,
             sales_detail_df=filtered_dataframes['SalesOrderDetail'],
             product_df=filtered_dataframes['Product']
         )
 
     elif chart_option == "📍 Sales by Territory":
-        plot_sales_by_territory(filtered_dataframes)
+        show_chart(plot_sales_by_territory, filter_key, filtered_dataframes)
 
     elif chart_option == "🇺🇸 US Region-wise Sales YTD":
-        conn = get_connection()
-        plot_us_region_sales(conn)
+        us_sales = run_query(us_region_sales)
+        if us_sales is not None:
+            plot_us_region_sales(us_sales)
 
     elif chart_option == "🌍 Country-wise Sales YTD":
-        conn = pyodbc.connect("Driver={SQL Server};Server=DESKTOP-R54T5QR\\SQLEXPRESS;Database=AdventureWorks2025;Trusted_Connection=yes;")
         st.subheader("🌍 Country-wise Sales YTD Analysis (in Lakhs)")
-        plot_sales_by_country(conn)
+        sales_by_country = run_query(country_sales)
+        if sales_by_country is not None:
+            plot_sales_by_country(sales_by_country)
 
     elif chart_option == "🔄 Demand vs Supply by Product":
-        demand_supply = filtered_dataframes['Product'][['ProductID', 'Name']].merge(
-            filtered_dataframes['ProductInventory'].groupby('ProductID')['Quantity'].sum().reset_index(),
-            on='ProductID', how='left'
-        ).fillna({'Quantity': 0})
-        demand_supply['OrderQty'] = 0  # Placeholder
-        plot_demand_vs_supply(demand_supply)
+        show_chart(
+            plot_demand_vs_supply, filter_key,
+            filtered_dataframes['Product'], filtered_dataframes['ProductInventory'], filtered_dataframes[DEMAND_FORECAST]
+        )
 
     elif chart_option == "📦 Fill Rate by Product Category":
-        required_tables = ['SalesOrderDetail', 'WorkOrder', 'Product', 'ProductSubcategory', 'ProductCategory']
+        required_tables = ['SalesOrderDetail', 'WorkOrder', PRODUCT_DIMENSION]
         if all(name in filtered_dataframes for name in required_tables):
-            p_df = filtered_dataframes['Product']
-            sc_df = filtered_dataframes['ProductSubcategory']
-            c_df = filtered_dataframes['ProductCategory']
-
-            p_df['ProductSubcategoryID'] = p_df['ProductSubcategoryID'].astype(str)
-            sc_df['ProductSubcategoryID'] = sc_df['ProductSubcategoryID'].astype(str)
-            sc_df['ProductCategoryID'] = sc_df['ProductCategoryID'].astype(str)
-            c_df['ProductCategoryID'] = c_df['ProductCategoryID'].astype(str)
-
-            plot_fill_rate_by_product_category(
+            show_chart(
+                plot_fill_rate_by_product_category, filter_key,
                 sales_df=filtered_dataframes['SalesOrderDetail'],
                 wo_df=filtered_dataframes['WorkOrder'],
-                product_df=p_df,
-                subcategory_df=sc_df,
-                category_df=c_df
+                product_dim=filtered_dataframes[PRODUCT_DIMENSION]
             )
         else:
             st.warning("⚠️ Missing tables required for Fill Rate analysis.")
@@ -510,55 +692,77 @@ elif page == "📊 Advanced Analysis & Correlations":
         if st.button("🔄 Reset Filters"):
             st.rerun()
 
-    filtered_dataframes = dataframes.copy()
+    # 📊 CHART OPTIONS
+    page_charts = {
+        "🏷️ Top 10 Subcategories by Sales Quantity": plot_top_subcategories_by_sales_and_production,
+        "🏭 Top 10 Subcategories by Production Quantity": plot_top_subcategories_by_production,
+        "📦 Inventory, Sales & Delay Correlation": plot_inventory_delay_correlation,
+        "💸 Cost of Stockouts": plot_cost_of_stockouts
+    }
+    chart_option = st.selectbox("🧪 Select an analysis to visualize:", tuple(page_charts))
+    st.markdown("---")
+
+    selected_chart = page_charts[chart_option]
+    dataframes = table_store.require(chart_requirements(selected_chart), chart_periods(selected_chart))
+    product_df = dataframes.get('Product')
+    subcategory_df = dataframes.get('ProductSubcategory')
+    location_df = dataframes.get('Location')
+
+    filtered_dataframes = FilteredTables(dataframes)
     if filter_type == "Product Name" and selected_filter_value:
-        product_ids = product_df[product_df['Name'] == selected_filter_value]['ProductID'].tolist()
-        for key in filtered_dataframes:
-            if 'ProductID' in filtered_dataframes[key].columns:
-                filtered_dataframes[key] = filtered_dataframes[key][filtered_dataframes[key]['ProductID'].isin(product_ids)]
+        filters.select(filtered_dataframes, 'ProductID', filters.product_ids('Product', selected_filter_value))
 
     elif filter_type == "Location" and selected_filter_value:
-        location_ids = location_df[location_df['Name'] == selected_filter_value]['LocationID'].tolist()
-        if 'WorkOrderRouting' in filtered_dataframes:
-            filtered_dataframes['WorkOrderRouting'] = filtered_dataframes['WorkOrderRouting'][filtered_dataframes['WorkOrderRouting']['LocationID'].isin(location_ids)]
+        location_ids = filters.location_ids(selected_filter_value)
+        filters.select(filtered_dataframes, 'LocationID', location_ids)
+        if PRODUCT_FACTS in filtered_dataframes:
+            filtered_dataframes.replace(PRODUCT_FACTS, filtered_derived(table_store, PRODUCT_FACTS, location_ids=location_ids))
 
     elif filter_type == "Subcategory" and selected_filter_value:
-        sub_ids = subcategory_df[subcategory_df['Name'] == selected_filter_value]['ProductSubcategoryID'].astype(str).tolist()
-        filtered_products = product_df[product_df['ProductSubcategoryID'].astype(str).isin(sub_ids)]
-        for key in filtered_dataframes:
-            if 'ProductID' in filtered_dataframes[key].columns:
-                filtered_dataframes[key] = filtered_dataframes[key][filtered_dataframes[key]['ProductID'].isin(filtered_products['ProductID'])]
+        filters.select(filtered_dataframes, 'ProductID', filters.product_ids('Subcategory', selected_filter_value))
 
     elif filter_type == "Scrap Quantity" and scrap_qty_threshold is not None:
-        if 'WorkOrder' in filtered_dataframes:
-            filtered_dataframes['WorkOrder'] = filtered_dataframes['WorkOrder'][filtered_dataframes['WorkOrder']['ScrappedQty'] >= scrap_qty_threshold]
+        filtered_dataframes.where('ScrappedQty', lambda qty: qty >= scrap_qty_threshold, ['WorkOrder'])
+        if PRODUCT_FACTS in filtered_dataframes:
+            filtered_dataframes.replace(PRODUCT_FACTS, filtered_derived(table_store, PRODUCT_FACTS, scrap_qty_threshold=scrap_qty_threshold))
 
-    # 📊 CHART OPTIONS
-    chart_option = st.selectbox("🧪 Select an analysis to visualize:", (
-        "🏷️ Top 10 Subcategories by Sales Quantity",
-        "🏭 Top 10 Subcategories by Production Quantity",
-        "📦 Inventory, Sales & Delay Correlation",
-        "💸 Cost of Stockouts"
-    ))
-    st.markdown("---")
+    slice_moments(filtered_dataframes, filter_type, selected_filter_value)
+    filter_key = (filter_type, selected_filter_value, scrap_qty_threshold)
 
     if chart_option == "🏷️ Top 10 Subcategories by Sales Quantity":
-        plot_top_subcategories_by_sales_and_production(filtered_dataframes)
+        show_chart(plot_top_subcategories_by_sales_and_production, filter_key, filtered_dataframes)
 
     elif chart_option == "🏭 Top 10 Subcategories by Production Quantity":
-        plot_top_subcategories_by_production(filtered_dataframes)
+        show_chart(plot_top_subcategories_by_production, filter_key, filtered_dataframes)
 
     elif chart_option == "📦 Inventory, Sales & Delay Correlation":
-        plot_inventory_delay_correlation(filtered_dataframes)
+        show_chart(plot_inventory_delay_correlation, filter_key, filtered_dataframes)
 
     elif chart_option == "💸 Cost of Stockouts":
-        plot_cost_of_stockouts(
-            sales_order_detail=filtered_dataframes['SalesOrderDetail'],
-            inventory_df=filtered_dataframes['ProductInventory'],
-            product_df=filtered_dataframes['Product']
+        show_chart(
+            plot_cost_of_stockouts, filter_key,
+            product_facts=filtered_dataframes[PRODUCT_FACTS],
+            product_dim=filtered_dataframes[PRODUCT_DIMENSION]
         )
 
 
+# ---------- Load Report ----------
+if refreshed_tables:
+    st.sidebar.info("🔄 Refreshed: " + ", ".join(f"{name} ({change})" for name, change in refreshed_tables.items()))
+for table_name, error in list(table_store.errors.items()):
+    st.sidebar.warning(f"⚠️ Could not load {table_name}: {error}")
+with st.sidebar.expander("⏱️ Data Load Report"):
+    st.dataframe(table_store.load_report(), use_container_width=True)
+with st.sidebar.expander("🧮 Aggregate Cache"):
+    cache_stats = get_aggregate_cache().stats()
+    st.write(
+        f"{cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['evictions']} evictions; "
+        f"{cache_stats['entries']} entries using {cache_stats['bytes'] / 1e6:.1f} of {cache_stats['budget_bytes'] / 1e6:.0f} MB"
+    )
+with st.sidebar.expander("🧩 Analysis Steps"):
+    st.dataframe(step_report(), use_container_width=True)
+
+
 # ---------- Footer ----------
 st.markdown("""
     <hr style="margin-top: 30px;">
@@ -0,0 +1,769 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from schema import SCHEMA_VERSION, apply_schema
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pa_parquet
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Loaded tables are shared by every session and chart; under copy-on-write the shallow
+# copies handed out here can be filtered and extended without writing through to them
+# (always on from pandas 3)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+
+SNAPSHOT_DIR = '.snapshots'
+# 'parquet' (compact), 'feather', or 'arrow': uncompressed Arrow IPC that is
+# memory-mapped on read, so every session and worker process on the host
+# shares the same page-cache pages instead of holding private copies
+SNAPSHOT_FORMAT = os.environ.get('SNAPSHOT_FORMAT', 'parquet')
+MEMORY_MAPPED = SNAPSHOT_FORMAT == 'arrow'
+
+# Large fact tables are also stored one file per month of this column so
+# date-bounded charts read only the months they overlap
+PARTITION_DIR = '.partitions'
+PARTITION_COLUMNS = {
+    'SalesOrderHeader': 'OrderDate',
+    'SalesOrderDetail': 'ModifiedDate',
+    'WorkOrder': 'StartDate',
+}
+CSV_ENGINE = 'pyarrow' if HAS_PYARROW else 'c'
+
+
+def list_tables(input_dir):
+    return sorted(
+        filename[:-len('.csv')]
+        for filename in os.listdir(input_dir)
+        if filename.endswith('.csv')
+    )
+
+
+def _hash_file(path, limit=None):
+    digest = hashlib.blake2b(digest_size=16)
+    remaining = limit
+    with open(path, 'rb') as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(1 << 20 if remaining is None else min(1 << 20, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def file_signature(csv_path, size=None):
+    # Identifies the exact bytes a frame was parsed from (the first `size` bytes)
+    stat = os.stat(csv_path)
+    size = stat.st_size if size is None else size
+    with open(csv_path, 'rb') as f:
+        f.seek(max(size - 1, 0))
+        last_byte = f.read(1) if size else b''
+    return {
+        'size': size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha': _hash_file(csv_path, size),
+        'ends_with_newline': last_byte == b'\n',
+    }
+
+
+def classify_change(csv_path, signature):
+    # unchanged, touched (same bytes, new mtime), appended (old bytes are a prefix) or replaced
+    if signature is None:
+        return 'replaced'
+    stat = os.stat(csv_path)
+    if stat.st_size == signature['size'] and stat.st_mtime_ns == signature['mtime_ns']:
+        return 'unchanged'
+    if stat.st_size == signature['size']:
+        return 'touched' if _hash_file(csv_path) == signature['sha'] else 'replaced'
+    if (
+        stat.st_size > signature['size']
+        and signature.get('ends_with_newline')
+        and _hash_file(csv_path, signature['size']) == signature['sha']
+    ):
+        return 'appended'
+    return 'replaced'
+
+
+def _snapshot_paths(input_dir, table_name):
+    snapshot_dir = os.path.join(input_dir, SNAPSHOT_DIR)
+    return (
+        os.path.join(snapshot_dir, f'{table_name}.{SNAPSHOT_FORMAT}'),
+        # One manifest per format, so switching formats never reads another format's signature
+        os.path.join(snapshot_dir, f'{table_name}.{SNAPSHOT_FORMAT}.json'),
+    )
+
+
+def _read_manifest(manifest_path):
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _manifest_current(manifest):
+    # Describes a snapshot written in this format under this schema
+    return (
+        manifest is not None
+        and manifest.get('schema_version') == SCHEMA_VERSION
+        and manifest.get('format') == SNAPSHOT_FORMAT
+    )
+
+
+def _tmp_path(path):
+    # Unique per process and thread so concurrent writers never share a temp file
+    return f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+
+def _write_manifest(manifest_path, manifest):
+    tmp_path = _tmp_path(manifest_path)
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def _project(columns, available):
+    if columns is None:
+        return None
+    return [c for c in columns if c in set(available)]
+
+
+def _select(df, columns):
+    return df if columns is None else df[_project(columns, df.columns)]
+
+
+def _read_csv(source, columns=None):
+    # The pyarrow engine parses on multiple threads but only takes usecols as a list
+    if columns is None:
+        return pd.read_csv(source, engine=CSV_ENGINE)
+    header = pd.read_csv(source, nrows=0).columns
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return pd.read_csv(source, engine=CSV_ENGINE, usecols=_project(columns, header))
+
+
+def _read_tail(csv_path, offset, columns=None):
+    # Parse only the rows written after `offset`, reusing the file's header line.
+    # A half-written last line is left for the next refresh.
+    with open(csv_path, 'rb') as f:
+        header = f.readline()
+        f.seek(offset)
+        tail = f.read()
+    end = tail.rfind(b'\n') + 1
+    return _read_csv(io.BytesIO(header + tail[:end]), columns), offset + end
+
+
+def _concat_rows(table_name, base, tail):
+    df = pd.concat([base, tail], ignore_index=True)
+    # Categoricals with new values (and int columns that met a NaN) come back widened
+    widened = [c for c in df.columns if c in base.columns and df[c].dtype != base[c].dtype]
+    return apply_schema(table_name, df, columns=widened) if widened else df
+
+
+def _parse_csv(table_name, csv_path, columns=None):
+    # Re-parse if the file moved underneath us so the signature matches the rows
+    for _ in range(3):
+        before = os.stat(csv_path)
+        df = apply_schema(table_name, _read_csv(csv_path, columns))
+        after = os.stat(csv_path)
+        if (before.st_size, before.st_mtime_ns) == (after.st_size, after.st_mtime_ns):
+            break
+    return df, file_signature(csv_path, after.st_size)
+
+
+def _arrow_to_pandas(table):
+    # split_blocks keeps numeric columns as read-only views of the mapped file;
+    # strings stay Arrow-backed instead of being copied into Python objects
+    string_dtype = pd.StringDtype('pyarrow')
+    types = {pa.string(): string_dtype, pa.large_string(): string_dtype}
+    return table.to_pandas(split_blocks=True, types_mapper=types.get)
+
+
+def _read_snapshot(snapshot_path, columns=None):
+    if SNAPSHOT_FORMAT == 'arrow':
+        with pa.memory_map(snapshot_path) as source:
+            table = pa.ipc.open_file(source).read_all()
+        return _arrow_to_pandas(table.select(_project(columns, table.column_names)) if columns is not None else table)
+    if SNAPSHOT_FORMAT == 'feather':
+        with pa.memory_map(snapshot_path) as source:
+            available = pa.ipc.open_file(source).schema.names
+        return pd.read_feather(snapshot_path, columns=_project(columns, available))
+    available = pa_parquet.read_schema(snapshot_path).names
+    return pd.read_parquet(snapshot_path, columns=_project(columns, available))
+
+
+def _write_snapshot(df, snapshot_path):
+    tmp_path = _tmp_path(snapshot_path)
+    if SNAPSHOT_FORMAT == 'arrow':
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    elif SNAPSHOT_FORMAT == 'feather':
+        df.reset_index(drop=True).to_feather(tmp_path)
+    else:
+        df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, snapshot_path)
+
+
+def _store_snapshot(df, snapshot_path, manifest_path, signature):
+    os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+    _write_snapshot(df, snapshot_path)
+    _write_manifest(manifest_path, dict(
+        signature, format=SNAPSHOT_FORMAT, schema_version=SCHEMA_VERSION
+    ))
+
+
+def _read_table(input_dir, table_name, columns=None):
+    csv_path = os.path.join(input_dir, f'{table_name}.csv')
+    if not HAS_PYARROW:
+        return _parse_csv(table_name, csv_path, columns)
+
+    snapshot_path, manifest_path = _snapshot_paths(input_dir, table_name)
+    manifest = _read_manifest(manifest_path)
+    if not _manifest_current(manifest) or not os.path.exists(snapshot_path):
+        manifest = None
+    change = classify_change(csv_path, manifest)
+    try:
+        if change in ('unchanged', 'touched'):
+            df = _read_snapshot(snapshot_path, columns)
+            if change == 'touched':
+                manifest = dict(manifest, mtime_ns=os.stat(csv_path).st_mtime_ns)
+                _write_manifest(manifest_path, manifest)
+            return df, manifest
+        if change == 'appended':
+            # Only the new rows are parsed; the snapshot is extended and rewritten
+            tail, size = _read_tail(csv_path, manifest['size'])
+            df = _concat_rows(table_name, _read_snapshot(snapshot_path), apply_schema(table_name, tail))
+            signature = file_signature(csv_path, size)
+            _store_snapshot(df, snapshot_path, manifest_path, signature)
+            return _select(df, columns), signature
+    except Exception:
+        pass
+
+    # Cache miss: parse and type the CSV once, then write the columnar copy for next time
+    df, signature = _parse_csv(table_name, csv_path)
+    try:
+        _store_snapshot(df, snapshot_path, manifest_path, signature)
+    except Exception:
+        # A read-only export directory still loads, just without the snapshot
+        pass
+    return _select(df, columns), signature
+
+
+def read_table(input_dir, table_name, columns=None):
+    return _read_table(input_dir, table_name, columns)[0]
+
+
+# ---------- Date partitions ----------
+def _partition_paths(input_dir, table_name):
+    partition_dir = os.path.join(input_dir, PARTITION_DIR, table_name)
+    return partition_dir, os.path.join(partition_dir, f'_manifest.{SNAPSHOT_FORMAT}.json')
+
+
+def _write_partitions(partition_dir, table_name, df, existing=()):
+    # Rows are grouped by month; months that already exist are extended
+    months = df[PARTITION_COLUMNS[table_name]].dt.to_period('M')
+    written = []
+    for month, rows in df.groupby(months, sort=True):
+        key = str(month)
+        path = os.path.join(partition_dir, f'{key}.{SNAPSHOT_FORMAT}')
+        if key in existing:
+            rows = _concat_rows(table_name, _read_snapshot(path), rows)
+        _write_snapshot(rows.reset_index(drop=True), path)
+        written.append(key)
+    return written
+
+
+def partition_table(input_dir, table_name):
+    # Brings the month partitions in line with the CSV and returns their manifest
+    csv_path = os.path.join(input_dir, f'{table_name}.csv')
+    partition_dir, manifest_path = _partition_paths(input_dir, table_name)
+    manifest = _read_manifest(manifest_path)
+    if not _manifest_current(manifest):
+        manifest = None
+
+    change = classify_change(csv_path, manifest)
+    if change == 'unchanged':
+        return manifest
+    if change == 'touched':
+        manifest = dict(manifest, mtime_ns=os.stat(csv_path).st_mtime_ns)
+        _write_manifest(manifest_path, manifest)
+        return manifest
+
+    if change == 'appended':
+        tail, size = _read_tail(csv_path, manifest['size'])
+        written = _write_partitions(partition_dir, table_name, apply_schema(table_name, tail), set(manifest['months']))
+        signature = file_signature(csv_path, size)
+        months = sorted(set(manifest['months']) | set(written))
+    else:
+        df, signature = _read_table(input_dir, table_name)
+        shutil.rmtree(partition_dir, ignore_errors=True)
+        os.makedirs(partition_dir, exist_ok=True)
+        months = _write_partitions(partition_dir, table_name, df)
+
+    manifest = dict(signature, format=SNAPSHOT_FORMAT, schema_version=SCHEMA_VERSION, months=months)
+    _write_manifest(manifest_path, manifest)
+    return manifest
+
+
+def _read_table_range(input_dir, table_name, start, end, columns=None):
+    date_column = PARTITION_COLUMNS[table_name]
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    read_columns = None if columns is None else list(dict.fromkeys(list(columns) + [date_column]))
+
+    if HAS_PYARROW:
+        manifest = partition_table(input_dir, table_name)
+        partition_dir, _ = _partition_paths(input_dir, table_name)
+        months = [
+            key for key in manifest['months']
+            if start.to_period('M') <= pd.Period(key, 'M') <= end.to_period('M')
+        ]
+        frames = [
+            _read_snapshot(os.path.join(partition_dir, f'{key}.{SNAPSHOT_FORMAT}'), read_columns)
+            for key in months
+        ]
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=read_columns or [date_column])
+        signature = manifest
+    else:
+        df, signature = _read_table(input_dir, table_name, read_columns)
+
+    # Partitions are whole months; trim to the exact bounds
+    df = df[(df[date_column] >= start) & (df[date_column] <= end)].reset_index(drop=True)
+    return _select(df, columns), signature
+
+
+def read_table_range(input_dir, table_name, start, end, columns=None):
+    return _read_table_range(input_dir, table_name, start, end, columns)[0]
+
+
+REPORT_COLUMNS = ['Table', 'Rows', 'Columns', 'Seconds', 'Error']
+
+
+def _report_row(label, df, error, seconds):
+    return {
+        'Table': label,
+        'Rows': len(df) if df is not None else 0,
+        'Columns': len(df.columns) if df is not None else 0,
+        'Seconds': round(seconds, 3),
+        'Error': f'{type(error).__name__}: {error}' if error is not None else '',
+    }
+
+
+def _timed_read(input_dir, table_name, columns):
+    start = time.perf_counter()
+    try:
+        df, signature = _read_table(input_dir, table_name, columns)
+        error = None
+    except Exception as e:
+        df, signature, error = None, None, e
+    return table_name, df, signature, error, time.perf_counter() - start
+
+
+def ingest_tables(input_dir, requirements, max_workers=None, signatures=None):
+    # Read tables concurrently; every table gets a report row, failures included
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(
+            lambda item: _timed_read(input_dir, *item), requirements.items()
+        ))
+
+    dataframes = {}
+    report = []
+    for table_name, df, signature, error, seconds in results:
+        if df is not None:
+            dataframes[table_name] = df
+            if signatures is not None:
+                signatures[table_name] = signature
+        report.append(_report_row(table_name, df, error, seconds))
+    return dataframes, pd.DataFrame(report, columns=REPORT_COLUMNS)
+
+
+# ---------- Lazy, column-projected loading ----------
+def uses_tables(**tables):
+    # Declares the tables (and columns, None = all) a chart reads
+    def decorator(fn):
+        fn.required_tables = tables
+        return fn
+    return decorator
+
+
+def uses_period(**periods):
+    # Declares a (start, end) date bound per partitioned table a chart reads
+    def decorator(fn):
+        fn.table_periods = periods
+        return fn
+    return decorator
+
+
+def aggregated_by(aggregate_fn):
+    # Links a render function to the function computing its aggregate, which carries the declarations
+    def decorator(fn):
+        fn.aggregate = aggregate_fn
+        return fn
+    return decorator
+
+
+def preview_of(aggregate_fn):
+    # Registers a fast sampled estimate of aggregate_fn's result, drawn first while the exact one runs
+    def decorator(fn):
+        aggregate_fn.preview = fn
+        return fn
+    return decorator
+
+
+def chart_tables(fn):
+    return getattr(getattr(fn, 'aggregate', fn), 'required_tables', {})
+
+
+def chart_periods(fn):
+    return getattr(getattr(fn, 'aggregate', fn), 'table_periods', {})
+
+
+def merge_requirements(*requirements):
+    merged = {}
+    for requirement in requirements:
+        for table_name, columns in requirement.items():
+            if columns is None or (table_name in merged and merged[table_name] is None):
+                merged[table_name] = None
+            else:
+                merged[table_name] = list(dict.fromkeys(merged.get(table_name, []) + list(columns)))
+    return merged
+
+
+class FilteredTables(Mapping):
+    # Read-only view over require() output; row filters are recorded per table and applied
+    # in one pass the first time a table is read, so tables a chart never reads are not filtered
+    def __init__(self, dataframes):
+        self._tables = dataframes
+        self._selections = {}
+        self._filters = {}
+        self._replaced = {}
+        self._filtered = {}
+
+    def __getitem__(self, table_name):
+        if table_name in self._replaced:
+            return self._replaced[table_name]
+        if table_name not in self._filtered:
+            df = self._tables[table_name]
+            selections = self._selections.get(table_name)
+            if selections:
+                # Sorted row positions from each selection, intersected, then taken once
+                rows = selections[0](df)
+                for select in selections[1:]:
+                    rows = np.intersect1d(rows, select(df), assume_unique=True)
+                if len(rows) < len(df):
+                    df = df.take(rows)
+            filters = self._filters.get(table_name)
+            if filters:
+                mask = filters[0][1](df[filters[0][0]])
+                for column, predicate in filters[1:]:
+                    mask &= predicate(df[column])
+                if not mask.all():
+                    df = df[mask]
+            self._filtered[table_name] = df
+        return self._filtered[table_name]
+
+    def __contains__(self, table_name):
+        return table_name in self._tables
+
+    def __iter__(self):
+        return iter(self._tables)
+
+    def __len__(self):
+        return len(self._tables)
+
+    def select(self, table_name, column, rows):
+        # rows(df) returns the sorted positions to keep; used for key lookups answered from an index
+        if table_name in self._tables and column in self._tables[table_name].columns:
+            self._selections.setdefault(table_name, []).append(rows)
+            self._filtered.pop(table_name, None)
+        return self
+
+    def where(self, column, predicate, tables=None):
+        # Keeps rows where predicate(df[column]) holds, in every listed table (default: all) having that column
+        for table_name in self._tables if tables is None else tables:
+            if table_name in self._tables and column in self._tables[table_name].columns:
+                self._filters.setdefault(table_name, []).append((column, predicate))
+                self._filtered.pop(table_name, None)
+        return self
+
+    def replace(self, table_name, df):
+        # For tables a row filter cannot express, such as aggregates rebuilt from filtered rows
+        if table_name in self._tables:
+            self._replaced[table_name] = df
+        return self
+
+
+class TableStore:
+    def __init__(self, input_dir, max_workers=None):
+        self.input_dir = input_dir
+        self.max_workers = max_workers
+        self.errors = {}
+        self._tables = {}
+        self._requested = {}
+        self._signatures = {}
+        self._versions = {}
+        self._ranges = {}
+        self._range_signatures = {}
+        self._report = deque(maxlen=100)
+        self._lock = threading.Lock()
+        self._derivations = {}
+        self._derived = {}
+        self._replaced_at = {}
+        self._derived_lock = threading.Lock()
+
+    def load_report(self):
+        return pd.concat(list(self._report), ignore_index=True) if self._report else pd.DataFrame()
+
+    def data_version(self, table_names):
+        # Changes whenever any of the tables (or a derived table's sources) is appended to or replaced
+        return tuple((name, self._versions.get(name, 0)) for name in sorted(self._sources(table_names)))
+
+    def register(self, name, requirements, build, update=None):
+        # A derived table is built from other tables by build(dataframes) and served by require() like any table.
+        # With update(previous, dataframes, row_counts), sources that were only appended to since the last
+        # build are folded in from their new rows (those past row_counts) instead of rebuilding
+        with self._derived_lock:
+            self._derivations[name] = (requirements, build, update)
+            self._derived.pop(name, None)
+
+    def derivation(self, name):
+        requirements, build, _ = self._derivations[name]
+        return requirements, build
+
+    def _sources(self, table_names):
+        sources = set()
+        for name in table_names:
+            if name in self._derivations:
+                sources |= self._sources(self._derivations[name][0])
+            else:
+                sources.add(name)
+        return sources
+
+    def _derive(self, name):
+        # Built once per data version of its sources and shared by every session
+        requirements, build, update = self._derivations[name]
+        cached = self._derived.get(name)
+        if cached is not None and cached[0] == self.data_version(requirements):
+            return cached[1]
+        dataframes = self.require(requirements)
+        version = self.data_version(requirements)
+        if cached is not None and update is not None and self._appended_since(cached[0]):
+            result = update(cached[1], dataframes, cached[2])
+        else:
+            result = build(dataframes)
+        row_counts = {table_name: len(df) for table_name, df in dataframes.items()}
+        with self._derived_lock:
+            self._derived[name] = (version, result, row_counts)
+        return result
+
+    def _appended_since(self, version):
+        return all(self._replaced_at.get(name, 0) <= table_version for name, table_version in version)
+
+    def refresh(self):
+        # One stat per loaded table; appended files only parse their new rows,
+        # replaced files are dropped and reloaded on demand
+        changes = {}
+        with self._lock:
+            for table_name in list(self._tables):
+                csv_path = os.path.join(self.input_dir, f'{table_name}.csv')
+                signature = self._signatures.get(table_name)
+                change = classify_change(csv_path, signature) if os.path.exists(csv_path) else 'removed'
+                if change == 'unchanged':
+                    continue
+                if change == 'touched':
+                    self._signatures[table_name] = dict(signature, mtime_ns=os.stat(csv_path).st_mtime_ns)
+                    continue
+                if change == 'appended':
+                    try:
+                        self._append(table_name, csv_path, signature)
+                    except Exception:
+                        change = 'replaced'
+                if change != 'appended':
+                    self._invalidate(table_name)
+                self._bump(table_name, appended=change == 'appended')
+                changes[table_name] = change
+
+            for table_name, signature in list(self._range_signatures.items()):
+                csv_path = os.path.join(self.input_dir, f'{table_name}.csv')
+                change = classify_change(csv_path, signature) if os.path.exists(csv_path) else 'removed'
+                if change == 'unchanged':
+                    continue
+                if change == 'touched':
+                    self._range_signatures[table_name] = dict(signature, mtime_ns=os.stat(csv_path).st_mtime_ns)
+                    continue
+                # Date slices are cheap to re-read from the partitions, so any change drops them
+                self._drop_ranges(table_name)
+                if table_name not in changes:
+                    self._bump(table_name)
+                    changes[table_name] = change
+        return changes
+
+    def require(self, requirements, periods=None):
+        # Tables with a period are read from their date partitions instead of in full
+        periods = periods or {}
+        derived = [name for name in requirements if name in self._derivations]
+        if derived:
+            requirements = {name: columns for name, columns in requirements.items() if name not in derived}
+            result = self.require(requirements, periods)
+            for name in derived:
+                try:
+                    result[name] = self._served(name, self._derive(name))
+                    self.errors.pop(name, None)
+                except Exception as e:
+                    self.errors[name] = f'{type(e).__name__}: {e}'
+            return result
+        available = set(list_tables(self.input_dir))
+        with self._lock:
+            pending = {}
+            for table_name, columns in requirements.items():
+                if table_name not in available or table_name in periods:
+                    continue
+                requested = self._requested.get(table_name, set())
+                if requested is None:
+                    continue
+                if columns is None:
+                    pending[table_name] = None
+                else:
+                    missing = [c for c in columns if c not in requested]
+                    if missing and MEMORY_MAPPED and table_name in self._tables:
+                        # Re-mapping every column is free; concatenating would copy them
+                        pending[table_name] = list(self._tables[table_name].columns) + missing
+                    elif missing:
+                        pending[table_name] = missing
+
+            if pending:
+                signatures = {}
+                loaded, report = ingest_tables(self.input_dir, pending, self.max_workers, signatures)
+                self._report.append(report)
+                for row in report.itertuples():
+                    if row.Error:
+                        self.errors[row.Table] = row.Error
+                    else:
+                        self.errors.pop(row.Table, None)
+                for table_name, df in loaded.items():
+                    self._merge(table_name, pending[table_name], df, signatures[table_name])
+
+            result = {
+                name: self._served(name, self._tables[name])
+                for name in requirements
+                if name in self._tables and name not in periods
+            }
+            for table_name, (start, end) in periods.items():
+                if table_name in requirements and table_name in available:
+                    df = self._require_range(table_name, requirements[table_name], start, end)
+                    if df is not None:
+                        # Not stamped: a date slice has its own row numbering, so indexes scan it
+                        result[table_name] = df.copy(deep=False)
+            return result
+
+    def _require_range(self, table_name, columns, start, end):
+        key = (table_name, str(start), str(end))
+        cached = self._ranges.get(key)
+        if cached is not None:
+            cached_columns, df = cached
+            if cached_columns is None or (columns is not None and set(columns) <= cached_columns):
+                return df
+            if columns is not None:
+                columns = list(dict.fromkeys(list(df.columns) + list(columns)))
+
+        started = time.perf_counter()
+        try:
+            df, signature = _read_table_range(self.input_dir, table_name, start, end, columns)
+            error = None
+        except Exception as e:
+            df, signature, error = None, None, e
+        label = f'{table_name} [{start} to {end}]'
+        self._report.append(pd.DataFrame(
+            [_report_row(label, df, error, time.perf_counter() - started)], columns=REPORT_COLUMNS
+        ))
+        if error is not None:
+            self.errors[label] = f'{type(error).__name__}: {error}'
+            return None
+        self.errors.pop(label, None)
+
+        previous = self._range_signatures.get(table_name)
+        if previous is not None and previous['sha'] != signature['sha']:
+            self._drop_ranges(table_name)
+            self._bump(table_name)
+        self._range_signatures[table_name] = signature
+        self._ranges[key] = (None if columns is None else set(columns), df)
+        return df
+
+    def _drop_ranges(self, table_name):
+        for key in [key for key in self._ranges if key[0] == table_name]:
+            del self._ranges[key]
+        self._range_signatures.pop(table_name, None)
+
+    def _served(self, name, df):
+        # A shallow copy stamped with the data version it was read at, so row positions indexed
+        # from one version are never applied to a frame of another
+        df = df.copy(deep=False)
+        df.attrs['data_version'] = self.data_version([name])
+        return df
+
+    def _bump(self, table_name, appended=False):
+        self._versions[table_name] = self._versions.get(table_name, 0) + 1
+        if not appended:
+            self._replaced_at[table_name] = self._versions[table_name]
+
+    def _invalidate(self, table_name):
+        self._tables.pop(table_name, None)
+        self._requested.pop(table_name, None)
+        self._signatures.pop(table_name, None)
+
+    def _append(self, table_name, csv_path, signature):
+        loaded = self._tables[table_name]
+        columns = None if self._requested.get(table_name) is None else list(loaded.columns)
+        if MEMORY_MAPPED:
+            # Extend the shared snapshot and map it again rather than holding a private copy
+            df, new_signature = _read_table(self.input_dir, table_name, columns)
+            self._tables[table_name] = df
+            self._signatures[table_name] = new_signature
+            return
+        tail, size = _read_tail(csv_path, signature['size'], columns)
+        self._tables[table_name] = _concat_rows(table_name, loaded, apply_schema(table_name, tail))
+        self._signatures[table_name] = file_signature(csv_path, size)
+
+    def _merge(self, table_name, columns, df, signature):
+        previous = self._signatures.get(table_name)
+        if previous is not None and previous['sha'] != signature['sha']:
+            # The file changed between loads; columns from two versions must not be mixed
+            earlier = self._tables.get(table_name)
+            self._invalidate(table_name)
+            self._bump(table_name)
+            if columns is not None and earlier is not None and set(earlier.columns) - set(columns):
+                # Columns loaded earlier came from the old file; read them again from the new one
+                columns = list(dict.fromkeys(list(earlier.columns) + list(columns)))
+                try:
+                    df, signature = _read_table(self.input_dir, table_name, columns)
+                except Exception as e:
+                    self.errors[table_name] = f'{type(e).__name__}: {e}'
+                    return
+        loaded = self._tables.get(table_name)
+        self._signatures[table_name] = signature
+        if columns is None:
+            self._tables[table_name] = df
+            self._requested[table_name] = None
+            return
+        if loaded is not None and not MEMORY_MAPPED:
+            df = pd.concat([loaded, df], axis=1) if len(df.columns) else loaded
+        self._tables[table_name] = df
+        self._requested[table_name] = self._requested.get(table_name, set()) | set(columns)
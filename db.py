@@ -0,0 +1,176 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+CONNECTION_STRING = os.environ.get(
+    'ADVENTUREWORKS_CONN',
+    "Driver={SQL Server};Server=DESKTOP-R54T5QR\\SQLEXPRESS;Database=AdventureWorks2025;Trusted_Connection=yes;"
+)
+
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 4))
+ACQUIRE_TIMEOUT = 10
+QUERY_TIMEOUT = int(os.environ.get('DB_QUERY_TIMEOUT', 30))
+# Idle connections older than this are pinged before being handed out
+HEALTH_CHECK_AFTER = 30
+HEALTH_CHECK_QUERY = 'SELECT 1'
+# Seconds a query result is shared between sessions before it is fetched again
+CACHE_TTL = int(os.environ.get('DB_CACHE_TTL', 300))
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+def sqlserver_connect(connection_string=CONNECTION_STRING, timeout=QUERY_TIMEOUT):
+    import pyodbc
+
+    def connect():
+        conn = pyodbc.connect(connection_string, timeout=ACQUIRE_TIMEOUT)
+        # Server-side query timeout, so a cancelled or abandoned query cannot hold a connection forever
+        conn.timeout = timeout
+        return conn
+    return connect
+
+
+def sqlite_connect(path):
+    # Offline stand-in: same tables, unqualified names
+    return lambda: sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+
+
+class ConnectionPool:
+    def __init__(self, connect, max_size=POOL_SIZE, acquire_timeout=ACQUIRE_TIMEOUT):
+        self.connect = connect
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _healthy(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute(HEALTH_CHECK_QUERY)
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        # The semaphore bounds open connections; waiting callers time out instead of piling up
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise PoolExhausted(f'No database connection free after {self.acquire_timeout}s')
+        try:
+            while True:
+                try:
+                    conn, idle_since = self._idle.get_nowait()
+                except queue.Empty:
+                    return self.connect()
+                if time.monotonic() - idle_since < HEALTH_CHECK_AFTER or self._healthy(conn):
+                    return conn
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, broken=False):
+        if broken:
+            self._discard(conn)
+        else:
+            self._idle.put((conn, time.monotonic()))
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            # State after a failed query is unknown, so the connection is not reused
+            self.release(conn, broken=True)
+            raise
+        else:
+            self.release(conn)
+
+
+class QueryExecutor:
+    def __init__(self, pool, timeout=QUERY_TIMEOUT, cache_ttl=CACHE_TTL):
+        self.pool = pool
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        # One worker per pooled connection; extra queries queue here rather than at the server
+        self._workers = ThreadPoolExecutor(max_workers=pool.max_size, thread_name_prefix='db-query')
+
+    def _run(self, query, params):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params or [])
+            columns = [col[0] for col in cursor.description]
+            rows = cursor.fetchall()
+            cursor.close()
+        return pd.DataFrame.from_records([tuple(row) for row in rows], columns=columns, coerce_float=True)
+
+    def _evict_failed(self, key, future):
+        if future.cancelled() or future.exception() is not None:
+            with self._cache_lock:
+                if self._cache.get(key, (None, None))[1] is future:
+                    del self._cache[key]
+
+    def cached_read_sql(self, query, params=None, timeout=None):
+        # Identical queries share one in-flight or finished result per TTL window
+        timeout = self.timeout if timeout is None else timeout
+        key = (query, tuple(params or ()))
+        now = time.monotonic()
+        submitted = False
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > now:
+                future = entry[1]
+            else:
+                for stale in [k for k, (expires, _) in self._cache.items() if expires <= now]:
+                    del self._cache[stale]
+                future = self._workers.submit(self._run, query, params)
+                self._cache[key] = (now + self.cache_ttl, future)
+                submitted = True
+        if submitted:
+            # Outside the lock: a future that already failed runs the callback inline
+            future.add_done_callback(lambda f: self._evict_failed(key, f))
+        try:
+            df = future.result(timeout=timeout)
+        except FutureTimeout:
+            # Other sessions may be waiting on the same query, so it is left to finish into the cache
+            raise QueryTimeout(f'Query did not finish within {timeout}s') from None
+        return df.copy(deep=False)
+
+
+def us_region_sales(executor):
+    return executor.cached_read_sql(
+        'SELECT Name, SalesYTD, SalesLastYear FROM Sales.SalesTerritory '
+        'WHERE CountryRegionCode = ? ORDER BY SalesYTD DESC',
+        ['US']
+    )
+
+
+def country_sales(executor):
+    return executor.cached_read_sql(
+        'SELECT CountryRegionCode, SUM(SalesYTD) AS SalesYTD, SUM(SalesLastYear) AS SalesLastYear '
+        'FROM Sales.SalesTerritory GROUP BY CountryRegionCode ORDER BY SUM(SalesYTD) DESC'
+    )
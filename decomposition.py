@@ -0,0 +1,43 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+MONTHS_PER_YEAR = 12
+
+
+def moving_average(matrix, period):
+    # Centred moving average down each column (a 2 x period average for even periods), NaN where
+    # the window runs off either end
+    if period % 2:
+        weights = np.full(period, 1.0 / period)
+    else:
+        weights = np.r_[0.5, np.ones(period - 1), 0.5] / period
+    half = len(weights) // 2
+    trend = np.full(matrix.shape, np.nan)
+    trend[half:len(matrix) - half] = sliding_window_view(matrix, len(weights), axis=0) @ weights
+    return trend
+
+
+def decompose(matrix, period=MONTHS_PER_YEAR):
+    # Additive decomposition of every column of a (time x series) matrix at once, matching
+    # statsmodels' seasonal_decompose(model='additive') per column. Needs two full periods;
+    # returns (trend, seasonal, resid) matrices, or None when the series are too short
+    matrix = np.asarray(matrix, dtype=np.float64)
+    if len(matrix) < 2 * period:
+        return None
+    trend = moving_average(matrix, period)
+    detrended = matrix - trend
+
+    # Average detrended value at each position in the period, centred to sum to zero
+    phase = np.arange(len(matrix)) % period
+    period_averages = np.stack([np.nanmean(detrended[phase == p], axis=0) for p in range(period)])
+    period_averages -= period_averages.mean(axis=0)
+    seasonal = period_averages[phase]
+    return trend, seasonal, detrended - seasonal
+
+
+def seasonal_strength(seasonal, resid):
+    # Per column: 1 - Var(resid) / Var(seasonal + resid), 0 for no seasonality up to 1 for pure seasonality
+    with np.errstate(invalid='ignore', divide='ignore'):
+        strength = 1 - np.nanvar(resid, axis=0) / np.nanvar(seasonal + resid, axis=0)
+    return np.clip(np.nan_to_num(strength), 0.0, 1.0)
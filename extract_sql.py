@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from data_loader import HAS_PYARROW, list_tables, read_table
+from db import CONNECTION_STRING, sqlite_connect, sqlserver_connect
+
+
+# Tables the dashboard reads, as schema-qualified SQL Server names
+TABLES = [
+    'Production.Product',
+    'Production.ProductSubcategory',
+    'Production.ProductCategory',
+    'Production.ProductInventory',
+    'Production.Location',
+    'Production.ScrapReason',
+    'Production.WorkOrder',
+    'Production.WorkOrderRouting',
+    'Sales.SalesOrderDetail',
+    'Sales.SalesOrderHeader',
+    'Sales.SalesTerritory',
+]
+
+# Primary key per table; an incremental run drops fetched rows whose key the CSV already has
+PRIMARY_KEYS = {
+    'Product': ['ProductID'],
+    'ProductSubcategory': ['ProductSubcategoryID'],
+    'ProductCategory': ['ProductCategoryID'],
+    'ProductInventory': ['ProductID', 'LocationID'],
+    'Location': ['LocationID'],
+    'ScrapReason': ['ScrapReasonID'],
+    'WorkOrder': ['WorkOrderID'],
+    'WorkOrderRouting': ['WorkOrderID', 'ProductID', 'OperationSequence'],
+    'SalesOrderDetail': ['SalesOrderID', 'SalesOrderDetailID'],
+    'SalesOrderHeader': ['SalesOrderID'],
+    'SalesTerritory': ['TerritoryID'],
+}
+
+BATCH_SIZE = 50_000
+STATE_FILE = '.extract_state.json'
+WATERMARK_COLUMN = 'ModifiedDate'
+
+_state_lock = threading.Lock()
+
+
+def _source_name(table, dialect):
+    return table.split('.')[-1] if dialect == 'sqlite' else table
+
+
+def _output_name(table):
+    return table.split('.')[-1]
+
+
+def _read_state(output_dir):
+    try:
+        with open(os.path.join(output_dir, STATE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_watermark(output_dir, table_name, watermark):
+    with _state_lock:
+        state = _read_state(output_dir)
+        state[table_name] = watermark
+        path = os.path.join(output_dir, STATE_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+
+def _append_file(source, path):
+    # Appends source to path and removes it; a failed copy truncates path back to its old size
+    size = os.path.getsize(path)
+    try:
+        with open(source, 'rb') as src, open(path, 'ab') as dst:
+            shutil.copyfileobj(src, dst)
+    except Exception:
+        os.truncate(path, size)
+        raise
+    finally:
+        os.remove(source)
+
+
+def extract_table(connect, table, output_dir, dialect='sqlserver', since=None,
+                  batch_size=BATCH_SIZE, snapshot=False):
+    table_name = _output_name(table)
+    csv_path = os.path.join(output_dir, f'{table_name}.csv')
+    if not os.path.exists(csv_path):
+        since = None
+    query = f'SELECT * FROM {_source_name(table, dialect)}'
+    params = []
+    if since is not None:
+        if dialect == 'sqlite':
+            # SQLite keeps dates as text in whatever form they were loaded ('... 00:00:00.000' sorts
+            # after '... 00:00:00'), so both sides are compared as numbers
+            query += f' WHERE julianday({WATERMARK_COLUMN}) > julianday(?)'
+            params.append(pd.Timestamp(since).isoformat(sep=' '))
+        else:
+            query += f' WHERE {WATERMARK_COLUMN} > ?'
+            params.append(pd.Timestamp(since).to_pydatetime())
+
+    # Every extract is staged in a temp file. A full one then replaces the CSV atomically; an
+    # incremental one is appended only once complete, which the loader picks up as an appended tail
+    appending = since is not None
+    target = f'{csv_path}.{os.getpid()}.tmp'
+    keys = PRIMARY_KEYS.get(table_name) if appending else None
+    existing = pd.MultiIndex.from_frame(pd.read_csv(csv_path, usecols=keys)) if keys else None
+
+    rows = 0
+    watermark = since
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        columns = [col[0] for col in cursor.description]
+        with open(target, 'w', newline='', encoding='utf-8') as f:
+            if not appending:
+                f.write(','.join(columns) + '\n')
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                df = pd.DataFrame.from_records([tuple(row) for row in batch], columns=columns)
+                if existing is not None:
+                    df = df[~pd.MultiIndex.from_frame(df[keys]).isin(existing)]
+                df.to_csv(f, header=False, index=False)
+                f.flush()
+                rows += len(df)
+                if WATERMARK_COLUMN in df.columns:
+                    batch_max = pd.to_datetime(df[WATERMARK_COLUMN], errors='coerce').max()
+                    if pd.notna(batch_max):
+                        batch_max = batch_max.isoformat(sep=' ')
+                        watermark = batch_max if watermark is None else max(watermark, batch_max)
+    except Exception:
+        if os.path.exists(target):
+            os.remove(target)
+        raise
+    finally:
+        conn.close()
+
+    if appending:
+        _append_file(target, csv_path)
+    else:
+        os.replace(target, csv_path)
+    if snapshot and HAS_PYARROW:
+        # Builds (or extends) the columnar copy through the loader so it matches what the dashboard parses
+        read_table(output_dir, table_name)
+    if watermark is not None:
+        _save_watermark(output_dir, table_name, watermark)
+    return rows
+
+
+def extract_tables(connect, tables, output_dir, dialect='sqlserver', incremental=False,
+                   max_workers=4, batch_size=BATCH_SIZE, snapshot=False):
+    # One connection per worker thread; pyodbc connections are not shared across threads
+    os.makedirs(output_dir, exist_ok=True)
+    state = _read_state(output_dir) if incremental else {}
+
+    def run(table):
+        started = time.perf_counter()
+        try:
+            rows = extract_table(
+                connect, table, output_dir, dialect,
+                since=state.get(_output_name(table)), batch_size=batch_size, snapshot=snapshot
+            )
+            error = ''
+        except Exception as e:
+            rows, error = 0, f'{type(e).__name__}: {e}'
+        return {'Table': table, 'Rows': rows, 'Seconds': round(time.perf_counter() - started, 3), 'Error': error}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return pd.DataFrame(list(pool.map(run, tables)))
+
+
+def build_sqlite_standin(csv_dir, sqlite_path):
+    # Loads an existing CSV export into SQLite so the extractor can run offline
+    with sqlite3.connect(sqlite_path) as conn:
+        for table_name in list_tables(csv_dir):
+            df = pd.read_csv(os.path.join(csv_dir, f'{table_name}.csv'))
+            df.to_sql(table_name, conn, if_exists='replace', index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract AdventureWorks tables into output_csvs')
+    parser.add_argument('--output', default='output_csvs')
+    parser.add_argument('--tables', nargs='*', default=TABLES, help='Schema-qualified table names')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--incremental', action='store_true',
+                        help='Append only rows with a newer ModifiedDate than the last run '
+                             '(suits insert-only tables; re-extract tables whose rows are updated)')
+    parser.add_argument('--snapshot', action='store_true',
+                        help='Also write the columnar snapshot the dashboard loads')
+    parser.add_argument('--connection', default=CONNECTION_STRING)
+    parser.add_argument('--sqlite', help='Read from this SQLite file instead of SQL Server')
+    parser.add_argument('--build-sqlite-from', metavar='CSV_DIR',
+                        help='Create the --sqlite stand-in from an existing CSV export and exit')
+    args = parser.parse_args()
+
+    if args.build_sqlite_from:
+        if not args.sqlite:
+            parser.error('--build-sqlite-from needs --sqlite')
+        build_sqlite_standin(args.build_sqlite_from, args.sqlite)
+        return
+
+    if args.sqlite:
+        connect, dialect = sqlite_connect(args.sqlite), 'sqlite'
+    else:
+        # Bulk reads run as long as they need to
+        connect, dialect = sqlserver_connect(args.connection, timeout=0), 'sqlserver'
+
+    report = extract_tables(
+        connect, args.tables, args.output, dialect,
+        incremental=args.incremental, max_workers=args.workers,
+        batch_size=args.batch_size, snapshot=args.snapshot
+    )
+    print(report.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import threading
+
+import numpy as np
+
+from model import (
+    DEMAND_FORECAST, INVENTORY_CUBE, INVENTORY_DELAY_MOMENTS, INVENTORY_MONTHLY, INVENTORY_SEASONALITY,
+    PRODUCT_DIMENSION, PRODUCT_FACTS, PRODUCT_SALES_MONTHLY, PRODUCTION_DELAY_MOMENTS, PRODUCTION_MONTHLY,
+)
+
+
+# Foreign-key graph: each key column and the tables whose rows it selects
+KEY_TABLES = {
+    'ProductID': [
+        'Product', 'ProductInventory', 'SalesOrderDetail', 'WorkOrder', 'WorkOrderRouting',
+        PRODUCT_FACTS, PRODUCTION_MONTHLY, INVENTORY_MONTHLY, INVENTORY_CUBE, INVENTORY_SEASONALITY,
+        PRODUCT_SALES_MONTHLY, DEMAND_FORECAST,
+    ],
+    'LocationID': [
+        'Location', 'ProductInventory', 'WorkOrderRouting', INVENTORY_MONTHLY, INVENTORY_CUBE, INVENTORY_SEASONALITY,
+    ],
+    'ProductSubcategoryID': [INVENTORY_DELAY_MOMENTS, PRODUCTION_DELAY_MOMENTS],
+}
+
+# Category -> Subcategory -> Product, resolved to ProductIDs through the product dimension
+PRODUCT_LEVELS = {
+    'Category': 'CategoryName',
+    'Subcategory': 'SubcategoryName',
+    'Product': 'ProductName',
+}
+
+NO_ROWS = np.array([], dtype=np.intp)
+
+
+class FilterEngine:
+    def __init__(self, table_store):
+        self.table_store = table_store
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _index(self, table_name, column, *carried):
+        # Row positions per key value, built once per data version of the table and shared by every
+        # session; the carried columns are loaded alongside for reading the matched rows
+        version = self.table_store.data_version([table_name])
+        cached = self._indexes.get((table_name, column))
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+        df = self.table_store.require({table_name: [column, *carried]}).get(table_name)
+        if df is None or column not in df.columns:
+            return None, {}
+        positions = df.groupby(column, sort=False).indices
+        with self._lock:
+            self._indexes[(table_name, column)] = (version, df, positions)
+        return df, positions
+
+    def product_ids(self, level, name):
+        dimension, positions = self._index(PRODUCT_DIMENSION, PRODUCT_LEVELS[level])
+        if dimension is None:
+            return []
+        return dimension.index.take(positions.get(name, NO_ROWS)).tolist()
+
+    def location_ids(self, name):
+        location, positions = self._index('Location', 'Name', 'LocationID')
+        if location is None:
+            return []
+        return location['LocationID'].take(positions.get(name, NO_ROWS)).tolist()
+
+    def subcategory_ids(self, name):
+        subcategory, positions = self._index('ProductSubcategory', 'Name', 'ProductSubcategoryID')
+        if subcategory is None:
+            return []
+        return subcategory['ProductSubcategoryID'].take(positions.get(name, NO_ROWS)).tolist()
+
+    def rows(self, df, table_name, column, keys):
+        # Concatenating the keys' position lists costs the size of the result, not of the table
+        indexed, positions = self._index(table_name, column)
+        version = df.attrs.get('data_version')
+        if indexed is None or version is None or version != indexed.attrs.get('data_version'):
+            # A frame from another data version has its own row numbering; fall back to a scan
+            return np.flatnonzero(df[column].isin(keys).to_numpy())
+        found = [positions[key] for key in keys if key in positions]
+        return np.sort(np.concatenate(found)) if found else NO_ROWS
+
+    def select(self, tables, column, keys, table_names=None):
+        # Propagates a key selection to every table carrying the key (or just table_names)
+        keys = list(keys)
+        for table_name in KEY_TABLES[column] if table_names is None else table_names:
+            tables.select(table_name, column, lambda df, table_name=table_name: self.rows(df, table_name, column, keys))
+        return tables
@@ -0,0 +1,73 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from decomposition import MONTHS_PER_YEAR
+
+
+# Smoothing constants tried for every SKU; each keeps the one with the smallest one-step error
+SES_ALPHAS = np.array([0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9])
+# SKUs are split evenly across the workers' tasks, but no task fits fewer than this many;
+# chunks run on a thread pool (the numpy kernels release the GIL)
+FORECAST_MIN_CHUNK_ROWS = 64
+FORECAST_WORKERS = int(os.environ.get('FORECAST_WORKERS', os.cpu_count() or 1))
+
+FORECAST_COLUMNS = ['Forecast', 'Model', 'Alpha', 'MAE']
+
+
+def exponential_smoothing(history, alphas=SES_ALPHAS):
+    # Simple exponential smoothing of every row of a (SKU x month) array under every alpha at once.
+    # Returns the (alpha x SKU x month) one-step-ahead predictions and the final levels
+    levels = np.broadcast_to(history[:, 0], (len(alphas), len(history))).copy()
+    predictions = np.empty((len(alphas),) + history.shape)
+    predictions[:, :, 0] = np.nan
+    weights = alphas[:, None]
+    for month in range(1, history.shape[1]):
+        predictions[:, :, month] = levels
+        levels += weights * (history[:, month] - levels)
+    return predictions, levels
+
+
+def fit_forecasts(history, season=MONTHS_PER_YEAR):
+    # Next-month forecast per row of a (SKU x month) array: simple exponential smoothing with the best
+    # alpha, or the seasonal naive value (same month last year) where that tracked the history better.
+    # Both models are scored by mean absolute one-step error over the months the seasonal one can see
+    history = np.asarray(history, dtype=np.float64)
+    n_skus, n_months = history.shape
+    if n_months == 0:
+        return pd.DataFrame({column: [] for column in FORECAST_COLUMNS})
+
+    predictions, levels = exponential_smoothing(history)
+    scored = slice(season, None) if n_months > season else slice(1, None)
+    if n_months > 1:
+        ses_errors = np.abs(predictions[:, :, scored] - history[:, scored]).mean(axis=2)
+    else:
+        ses_errors = np.zeros((len(SES_ALPHAS), n_skus))
+    best = np.argmin(ses_errors, axis=0)
+    rows = np.arange(n_skus)
+    forecast = levels[best, rows]
+    mae = ses_errors[best, rows]
+    model = np.full(n_skus, 'Exponential smoothing', dtype=object)
+    alpha = SES_ALPHAS[best]
+
+    if n_months > season:
+        naive_errors = np.abs(history[:, season:] - history[:, :-season]).mean(axis=1)
+        seasonal = naive_errors < mae
+        forecast = np.where(seasonal, history[:, n_months - season], forecast)
+        mae = np.where(seasonal, naive_errors, mae)
+        model[seasonal] = 'Seasonal naive'
+        alpha = np.where(seasonal, np.nan, alpha)
+
+    return pd.DataFrame({'Forecast': forecast, 'Model': model, 'Alpha': alpha, 'MAE': mae})
+
+
+def forecast_all(history, workers=FORECAST_WORKERS):
+    # fit_forecasts over row chunks of the array in parallel; rows keep their order
+    chunk_rows = max(FORECAST_MIN_CHUNK_ROWS, -(-len(history) // max(workers, 1)))
+    chunks = [history[start:start + chunk_rows] for start in range(0, len(history), chunk_rows)]
+    if len(chunks) <= 1 or workers <= 1:
+        return fit_forecasts(history).reset_index(drop=True)
+    with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        return pd.concat(list(pool.map(fit_forecasts, chunks)), ignore_index=True)
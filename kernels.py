@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+
+# Key ranges up to this many slots are binned directly; wider ones use pandas' hash group-by
+MAX_DIRECT_SLOTS = 1 << 22
+
+
+def _is_numpy_int(series):
+    return isinstance(series.dtype, np.dtype) and series.dtype.kind in 'iub'
+
+
+def _encode(keys):
+    # AdventureWorks IDs are small non-negative integers (int32 from the schema), so an ID is
+    # already a dense code into its key range; several keys combine into one code. Returns
+    # (codes, lows, sizes, valid), with valid None when no key is missing.
+    valid = None
+    if any(key.hasnans for key in keys):
+        valid = np.ones(len(keys[0]), dtype=bool)
+        for key in keys:
+            valid &= key.notna().to_numpy()
+    ids = [
+        key.to_numpy() if valid is None and _is_numpy_int(key) else key.to_numpy(dtype=np.int64, na_value=0)
+        for key in keys
+    ]
+    present = [i if valid is None else i[valid] for i in ids]
+    if not len(present[0]):
+        return np.zeros(len(ids[0]), dtype=np.intp), [0] * len(keys), [1] * len(keys), np.zeros(len(ids[0]), dtype=bool)
+    lows = [min(int(p.min()), 0) for p in present]
+    sizes = [int(p.max()) - low + 1 for p, low in zip(present, lows)]
+    if np.prod(sizes, dtype=float) > MAX_DIRECT_SLOTS:
+        return None
+    if len(keys) == 1 and lows[0] == 0:
+        codes = ids[0] if valid is None else np.where(valid, ids[0], 0)
+    else:
+        codes = np.ravel_multi_index([i - low if valid is None else np.where(valid, i - low, 0) for i, low in zip(ids, lows)], sizes)
+    return codes, lows, sizes, valid
+
+
+def _decode(slots, keys, lows, sizes):
+    levels = [
+        pd.Index(level + low, name=key.name).astype(key.dtype)
+        for level, key, low in zip(np.unravel_index(slots, sizes), keys, lows)
+    ]
+    return levels[0] if len(levels) == 1 else pd.MultiIndex.from_arrays(levels)
+
+
+def _reduce(keys, values, how):
+    keys = [keys] if isinstance(keys, pd.Series) else list(keys)
+    encoded = _encode(keys)
+    if encoded is None:
+        return getattr(values.groupby(keys), how)()
+    codes, lows, sizes, valid = encoded
+    size = int(np.prod(sizes))
+    keyed = codes if valid is None else codes[valid]
+
+    # A group exists if any row carries its key, as with groupby
+    rows = np.bincount(keyed, minlength=size)
+    slots = np.flatnonzero(rows)
+    index = _decode(slots, keys, lows, sizes)
+
+    def column(series):
+        numpy_int = _is_numpy_int(series)
+        data = series.to_numpy() if numpy_int else series.to_numpy(dtype=np.float64, na_value=np.nan)
+        if valid is not None:
+            data = data[valid]
+        count = rows
+        if not numpy_int:
+            # NaN values are skipped: weighted out of the sums and the counts
+            missing = np.isnan(data)
+            if missing.any():
+                count = np.rint(np.bincount(keyed, weights=~missing, minlength=size)).astype(np.int64)
+                data = np.where(missing, 0.0, data)
+        total = np.bincount(keyed, weights=data, minlength=size)[slots]
+        if how == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return pd.Series(total / count[slots], index=index, name=series.name)
+        if pd.api.types.is_integer_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+            total = np.rint(total).astype(np.int64)
+        return pd.Series(total, index=index, name=series.name)
+
+    if isinstance(values, pd.DataFrame):
+        return pd.DataFrame({name: column(values[name]) for name in values.columns}, index=index)
+    return column(values)
+
+
+def group_sum(keys, values):
+    # Same result as values.groupby(keys).sum() for integer entity keys, via np.bincount
+    return _reduce(keys, values, 'sum')
+
+
+def group_mean(keys, values):
+    return _reduce(keys, values, 'mean')
+
+
+def stratified_sample(n_rows, size, strata_of, min_per_stratum=50, seed=0, oversample=4):
+    # Row positions of a random sample of about `size` of n_rows rows. A uniform draw of oversample * size
+    # positions is labelled by strata_of(positions) and cut down per stratum in proportion to its share,
+    # keeping at least min_per_stratum (or all drawn) so small groups keep usable estimates. Only the
+    # drawn rows are ever labelled, so the cost does not grow with the table
+    drawn = np.random.default_rng(seed).choice(n_rows, size=min(n_rows, oversample * size), replace=False)
+    codes, _ = pd.factorize(pd.Series(strata_of(drawn)), use_na_sentinel=False)
+    quota = np.maximum(np.ceil(np.bincount(codes) * size / max(len(codes), 1)), min_per_stratum)
+    # The draw is in random order, so keeping each stratum's first rows keeps a random subset
+    rank = pd.Series(codes).groupby(codes).cumcount().to_numpy()
+    return np.sort(drawn[rank < quota[codes]])
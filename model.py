@@ -0,0 +1,293 @@
+import numpy as np
+import pandas as pd
+
+from decomposition import MONTHS_PER_YEAR, decompose, seasonal_strength
+from forecast import forecast_all
+from kernels import group_mean, group_sum
+from moments import partition_moments
+from sketches import SpaceSaving
+
+
+# ---------- Product dimension ----------
+PRODUCT_DIMENSION = 'ProductDimension'
+
+PRODUCT_DIMENSION_TABLES = {
+    'Product': ['ProductID', 'Name', 'ProductSubcategoryID', 'StandardCost', 'ListPrice', 'SafetyStockLevel'],
+    'ProductSubcategory': ['ProductSubcategoryID', 'ProductCategoryID', 'Name'],
+    'ProductCategory': ['ProductCategoryID', 'Name'],
+}
+
+
+def build_product_dimension(dataframes):
+    # Product -> Subcategory -> Category flattened once, indexed by ProductID
+    subcategory = dataframes['ProductSubcategory'].set_index('ProductSubcategoryID')
+    category = dataframes['ProductCategory'].set_index('ProductCategoryID')
+
+    dimension = dataframes['Product'].set_index('ProductID')[
+        ['Name', 'ProductSubcategoryID', 'StandardCost', 'ListPrice', 'SafetyStockLevel']
+    ].rename(columns={'Name': 'ProductName'})
+    dimension['SubcategoryName'] = dimension['ProductSubcategoryID'].map(subcategory['Name'])
+    dimension['ProductCategoryID'] = dimension['ProductSubcategoryID'].map(subcategory['ProductCategoryID']).astype('Int32')
+    dimension['CategoryName'] = dimension['ProductCategoryID'].map(category['Name'])
+    return dimension.sort_index()
+
+
+# ---------- Product facts ----------
+PRODUCT_FACTS = 'ProductFacts'
+
+PRODUCT_FACT_TABLES = {
+    'Product': ['ProductID'],
+    'ProductInventory': ['ProductID', 'Quantity'],
+    'SalesOrderDetail': ['ProductID', 'OrderQty'],
+    'WorkOrder': ['ProductID', 'OrderQty', 'EndDate', 'DueDate'],
+    'WorkOrderRouting': ['ProductID', 'ScheduledEndDate', 'ActualEndDate'],
+}
+
+
+def build_product_facts(dataframes):
+    # One row per product; measures stay NaN where a product has no rows, charts fill as they need
+    inventory = dataframes['ProductInventory']
+    sales = dataframes['SalesOrderDetail']
+    work_order = dataframes['WorkOrder']
+    routing = dataframes['WorkOrderRouting']
+
+    facts = dataframes['Product'][['ProductID']].reset_index(drop=True)
+    product_ids = facts['ProductID']
+    facts['InventoryQty'] = product_ids.map(group_sum(inventory['ProductID'], inventory['Quantity']))
+    facts['SalesQty'] = product_ids.map(group_sum(sales['ProductID'], sales['OrderQty']))
+    facts['ProducedQty'] = product_ids.map(group_sum(work_order['ProductID'], work_order['OrderQty']))
+
+    # Work orders finishing after their due date, and routing steps finishing after schedule
+    production_delay = (work_order['EndDate'] - work_order['DueDate']).dt.days
+    facts['ProductionDelayDays'] = product_ids.map(group_mean(work_order['ProductID'], production_delay))
+    routing_delay = (routing['ActualEndDate'] - routing['ScheduledEndDate']).dt.days
+    facts['AvgDelayDays'] = product_ids.map(group_mean(routing['ProductID'], routing_delay))
+
+    # Ordered quantity that on-hand inventory cannot cover
+    facts['Shortfall'] = (facts['SalesQty'] - facts['InventoryQty'].fillna(0)).clip(lower=0)
+    return facts
+
+
+# ---------- Correlation moments ----------
+INVENTORY_DELAY_MOMENTS = 'InventoryDelayMoments'
+PRODUCTION_DELAY_MOMENTS = 'ProductionDelayMoments'
+
+
+def inventory_delay_metrics(facts):
+    # Products with inventory, sales and a routing delay
+    metrics = facts[['InventoryQty', 'SalesQty', 'AvgDelayDays']].rename(columns={'SalesQty': 'TotalSalesQty'})
+    return metrics.dropna()
+
+
+def production_delay_metrics(facts):
+    # Missing quantities count as zero; products without a finished work order are left out
+    metrics = facts[['InventoryQty', 'SalesQty', 'ProducedQty']].fillna(0)
+    metrics['Stock_Shortage'] = metrics['SalesQty'] - metrics['InventoryQty']
+    metrics['ProductionDelayDays'] = facts['ProductionDelayDays']
+    return metrics.dropna(subset=['ProductionDelayDays'])
+
+
+# Moments table -> per-product metrics it accumulates
+CORRELATION_MOMENTS = {
+    INVENTORY_DELAY_MOMENTS: inventory_delay_metrics,
+    PRODUCTION_DELAY_MOMENTS: production_delay_metrics,
+}
+
+CORRELATION_MOMENT_TABLES = {
+    PRODUCT_FACTS: None,
+    PRODUCT_DIMENSION: ['ProductSubcategoryID'],
+}
+
+
+def build_moments(name):
+    def build(dataframes):
+        # One accumulator per subcategory, the slice the page filters select; products without
+        # a subcategory share partition 0
+        facts = dataframes[PRODUCT_FACTS]
+        metrics = CORRELATION_MOMENTS[name](facts)
+        subcategory = facts['ProductID'].map(dataframes[PRODUCT_DIMENSION]['ProductSubcategoryID']).fillna(0)
+        return partition_moments(subcategory.loc[metrics.index].rename('ProductSubcategoryID'), metrics)
+    return build
+
+
+# ---------- Inventory cube ----------
+INVENTORY_CUBE = 'InventoryCube'
+
+INVENTORY_CUBE_TABLES = {
+    'ProductInventory': ['ProductID', 'LocationID', 'Quantity'],
+    PRODUCT_DIMENSION: None,
+    'Location': ['LocationID', 'Name'],
+}
+
+
+def build_inventory_cube(dataframes):
+    # Quantity and value per product and location, labelled with every level the inventory page slices
+    # or drills by; a category, subcategory or location view is a groupby over these few rows
+    inventory = dataframes['ProductInventory']
+    dimension = dataframes[PRODUCT_DIMENSION]
+    locations = dataframes['Location'].set_index('LocationID')['Name']
+
+    cube = group_sum([inventory['ProductID'], inventory['LocationID']], inventory['Quantity']).reset_index()
+    cube = cube.join(dimension[['CategoryName', 'SubcategoryName', 'ProductName', 'StandardCost']], on='ProductID')
+    cube['LocationName'] = cube['LocationID'].map(locations)
+    cube['InventoryValue'] = cube['Quantity'] * cube.pop('StandardCost')
+    return cube
+
+
+# ---------- Monthly rollups ----------
+PRODUCTION_MONTHLY = 'ProductionMonthly'
+INVENTORY_MONTHLY = 'InventoryMonthly'
+SALES_MONTHLY = 'SalesMonthly'
+PRODUCT_SALES_MONTHLY = 'ProductSalesMonthly'
+
+# Rollup -> (source table, date column, keys, summed measures)
+MONTHLY_ROLLUPS = {
+    PRODUCTION_MONTHLY: ('WorkOrder', 'StartDate', ['ProductID'], ['OrderQty', 'ScrappedQty']),
+    INVENTORY_MONTHLY: ('ProductInventory', 'ModifiedDate', ['ProductID', 'LocationID'], ['Quantity']),
+    SALES_MONTHLY: ('SalesOrderHeader', 'OrderDate', ['TerritoryID'], ['TotalDue']),
+    PRODUCT_SALES_MONTHLY: ('SalesOrderDetail', 'ModifiedDate', ['ProductID'], ['OrderQty']),
+}
+
+
+def rollup_tables(name):
+    table_name, date_column, keys, measures = MONTHLY_ROLLUPS[name]
+    return {table_name: [date_column] + keys + measures}
+
+
+def monthly_rollup(df, date_column, keys, measures):
+    # Sums per month start and key; rows without a date are left out, as to_period('M') grouping did
+    dated = df[df[date_column].notna()]
+    month = dated[date_column].to_numpy().astype('datetime64[M]').astype('datetime64[ns]')
+    month = pd.Series(month, index=dated.index, name='Month')
+    return dated.groupby([month] + [dated[key] for key in keys], dropna=False)[measures].sum().reset_index()
+
+
+def build_rollup(name):
+    table_name, date_column, keys, measures = MONTHLY_ROLLUPS[name]
+
+    def build(dataframes):
+        return monthly_rollup(dataframes[table_name], date_column, keys, measures)
+    return build
+
+
+def update_rollup(name):
+    table_name, date_column, keys, measures = MONTHLY_ROLLUPS[name]
+
+    def update(previous, dataframes, row_counts):
+        # Only appended rows are rolled up; a month they share with the previous rollup is summed into it
+        tail = dataframes[table_name].iloc[row_counts[table_name]:]
+        rolled = pd.concat([previous, monthly_rollup(tail, date_column, keys, measures)], ignore_index=True)
+        return rolled.groupby(['Month'] + keys, dropna=False)[measures].sum().reset_index()
+    return update
+
+
+# ---------- Seasonal decomposition ----------
+INVENTORY_SEASONALITY = 'InventorySeasonality'
+
+SEASONALITY_COMPONENTS = ['Observed', 'Trend', 'Seasonal', 'Resid']
+
+
+def build_inventory_seasonality(dataframes):
+    # Trend, seasonal and residual per product and location month, from one decomposition of the
+    # month x series matrix (months without inventory count as 0). The decomposition is linear, so
+    # any slice's total decomposes to the sum of its rows' components
+    rollup = dataframes[INVENTORY_MONTHLY]
+    matrix = rollup.pivot_table(index='Month', columns=['ProductID', 'LocationID'], values='Quantity', aggfunc='sum')
+    if not matrix.empty:
+        months = pd.date_range(matrix.index.min(), matrix.index.max(), freq='MS')
+        matrix = matrix.reindex(months)
+    observed = matrix.fillna(0).to_numpy(dtype=np.float64)
+    components = decompose(observed, MONTHS_PER_YEAR)
+    if components is None:
+        return pd.DataFrame(columns=['Month', 'ProductID', 'LocationID'] + SEASONALITY_COMPONENTS + ['SeasonalStrength'])
+
+    trend, seasonal, resid = components
+    series = matrix.columns
+    n_months = len(matrix)
+    return pd.DataFrame({
+        'Month': np.repeat(matrix.index.to_numpy(), len(series)),
+        'ProductID': np.tile(series.get_level_values('ProductID').to_numpy(), n_months),
+        'LocationID': np.tile(series.get_level_values('LocationID').to_numpy(), n_months),
+        'Observed': observed.ravel(),
+        'Trend': trend.ravel(),
+        'Seasonal': seasonal.ravel(),
+        'Resid': resid.ravel(),
+        'SeasonalStrength': np.tile(seasonal_strength(seasonal, resid), n_months),
+    })
+
+
+# ---------- Demand forecasts ----------
+DEMAND_FORECAST = 'DemandForecast'
+
+
+def sales_history(rollup):
+    # ProductID x month array of units sold, every month from the first to the last sale (0 where none)
+    history = rollup.pivot_table(index='ProductID', columns='Month', values='OrderQty', aggfunc='sum')
+    if not history.empty:
+        history = history.reindex(columns=pd.date_range(history.columns.min(), history.columns.max(), freq='MS'))
+    history = history.fillna(0)
+    # Changes whenever the product's history (or the month range) does
+    return history, pd.util.hash_pandas_object(history, index=False)
+
+
+def _forecast(history, fingerprint):
+    forecasts = forecast_all(history.to_numpy(dtype=np.float64))
+    forecasts.insert(0, 'ProductID', history.index.to_numpy())
+    forecasts['Fingerprint'] = fingerprint.to_numpy()
+    return forecasts
+
+
+def build_demand_forecast(dataframes):
+    return _forecast(*sales_history(dataframes[PRODUCT_SALES_MONTHLY]))
+
+
+def update_demand_forecast(previous, dataframes, row_counts):
+    # Only products whose history changed are refitted; a new month changes every product's history
+    history, fingerprint = sales_history(dataframes[PRODUCT_SALES_MONTHLY])
+    unchanged = fingerprint.eq(previous.set_index('ProductID')['Fingerprint'].reindex(fingerprint.index))
+    if unchanged.all():
+        return previous
+    kept = previous[previous['ProductID'].isin(unchanged.index[unchanged])]
+    refitted = _forecast(history[~unchanged.to_numpy()], fingerprint[~unchanged])
+    return pd.concat([kept, refitted], ignore_index=True).sort_values('ProductID', ignore_index=True)
+
+
+# ---------- Heavy-hitter sketches ----------
+SUPPLIER_SALES_SKETCH = 'SupplierSalesSketch'
+
+SUPPLIER_SALES_SKETCH_TABLES = {
+    'SalesOrderDetail': ['ProductID', 'LineTotal'],
+    'Product': ['ProductID', 'ProductModelID'],
+}
+
+
+def _stream_supplier_sales(sketch, sales, product):
+    # Sales value per ProductModelID (the proxy supplier), one pass over the order lines
+    models = sales['ProductID'].map(product.set_index('ProductID')['ProductModelID'])
+    return sketch.update(models, sales['LineTotal'])
+
+
+def build_supplier_sales_sketch(dataframes):
+    sketch = SpaceSaving(key_name='ProductModelID')
+    return _stream_supplier_sales(sketch, dataframes['SalesOrderDetail'], dataframes['Product']).to_frame()
+
+
+def update_supplier_sales_sketch(previous, dataframes, row_counts):
+    # New order lines are streamed into the existing counters
+    sales = dataframes['SalesOrderDetail'].iloc[row_counts['SalesOrderDetail']:]
+    return _stream_supplier_sales(SpaceSaving.from_frame(previous), sales, dataframes['Product']).to_frame()
+
+
+def register_models(table_store):
+    table_store.register(PRODUCT_DIMENSION, PRODUCT_DIMENSION_TABLES, build_product_dimension)
+    table_store.register(PRODUCT_FACTS, PRODUCT_FACT_TABLES, build_product_facts)
+    table_store.register(INVENTORY_CUBE, INVENTORY_CUBE_TABLES, build_inventory_cube)
+    for name in CORRELATION_MOMENTS:
+        table_store.register(name, CORRELATION_MOMENT_TABLES, build_moments(name))
+    for name in MONTHLY_ROLLUPS:
+        table_store.register(name, rollup_tables(name), build_rollup(name), update_rollup(name))
+    table_store.register(INVENTORY_SEASONALITY, {INVENTORY_MONTHLY: None}, build_inventory_seasonality)
+    table_store.register(DEMAND_FORECAST, {PRODUCT_SALES_MONTHLY: None}, build_demand_forecast, update_demand_forecast)
+    table_store.register(
+        SUPPLIER_SALES_SKETCH, SUPPLIER_SALES_SKETCH_TABLES, build_supplier_sales_sketch, update_supplier_sales_sketch
+    )
@@ -0,0 +1,62 @@
+from itertools import combinations_with_replacement
+
+import numpy as np
+import pandas as pd
+
+from kernels import group_sum
+
+
+def _sum_column(metric):
+    return f'Sum:{metric}'
+
+
+def _cross_column(a, b):
+    return f'Cross:{a}:{b}'
+
+
+class Moments:
+    # Count, per-metric sums and per-pair cross-product sums over complete rows. Accumulators of
+    # disjoint row sets add up to the accumulator of their union, and a correlation matrix is read
+    # off one in O(metrics^2) without revisiting the rows
+    def __init__(self, metrics, count=0.0, sums=None, cross=None):
+        self.metrics = list(metrics)
+        size = len(self.metrics)
+        self.count = float(count)
+        self.sums = np.zeros(size) if sums is None else np.asarray(sums, dtype=np.float64)
+        self.cross = np.zeros((size, size)) if cross is None else np.asarray(cross, dtype=np.float64)
+
+    @classmethod
+    def from_partitions(cls, metrics, partitions):
+        # Sums partition rows as laid out by partition_moments()
+        totals = partitions.sum(numeric_only=True)
+        moments = cls(metrics, totals.get('Count', 0.0), [totals.get(_sum_column(m), 0.0) for m in metrics])
+        for (i, a), (j, b) in combinations_with_replacement(enumerate(moments.metrics), 2):
+            moments.cross[i, j] = moments.cross[j, i] = totals.get(_cross_column(a, b), 0.0)
+        return moments
+
+    def covariance(self):
+        # Sample covariance (ddof=1), as DataFrame.cov()
+        if self.count < 2:
+            return np.full_like(self.cross, np.nan)
+        return (self.cross - np.outer(self.sums, self.sums) / self.count) / (self.count - 1)
+
+    def corr(self):
+        covariance = self.covariance()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scale = np.sqrt(np.diag(covariance))
+            corr = covariance / np.outer(scale, scale)
+        np.fill_diagonal(corr, np.where(scale > 0, 1.0, np.nan))
+        return pd.DataFrame(np.clip(corr, -1.0, 1.0), index=self.metrics, columns=self.metrics)
+
+
+def partition_moments(keys, frame):
+    # One accumulator row per key over the frame's complete rows: Count, Sum:<metric> and
+    # Cross:<a>:<b> for every metric pair (a before b, squares included)
+    complete = frame.notna().all(axis=1)
+    keys = pd.Series(keys, index=frame.index)[complete]
+    frame = frame[complete].astype(np.float64)
+    columns = {'Count': pd.Series(1.0, index=frame.index)}
+    columns.update({_sum_column(metric): frame[metric] for metric in frame.columns})
+    for a, b in combinations_with_replacement(frame.columns, 2):
+        columns[_cross_column(a, b)] = frame[a] * frame[b]
+    return group_sum(keys, pd.DataFrame(columns)).reset_index()
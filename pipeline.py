@@ -0,0 +1,86 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import pandas as pd
+
+from data_loader import merge_requirements
+
+
+# Every registered step by name, in definition order (upstream steps come first)
+STEPS = {}
+
+_stats = {}
+_stats_lock = threading.Lock()
+# The chart evaluation running on this thread: (table store, cache, filter key)
+_scope = threading.local()
+
+
+def step(*inputs, **tables):
+    # A named analysis step over the chart's dataframes. It reads the given tables (and columns,
+    # None = all) and receives the results of its input steps after the dataframes. Inside
+    # evaluation() each step runs once per data version and filter and is shared by every chart
+    # reaching it; outside, it is a plain function
+    def decorator(fn):
+        @wraps(fn)
+        def run(dataframes):
+            scope = getattr(_scope, 'current', None)
+            if scope is None:
+                return fn(dataframes, *[upstream(dataframes) for upstream in inputs])
+            table_store, cache, filter_key = scope
+            _record(fn.__name__, calls=1)
+
+            def compute():
+                upstream_results = [upstream(dataframes) for upstream in inputs]
+                start = time.perf_counter()
+                result = fn(dataframes, *upstream_results)
+                _record(fn.__name__, runs=1, seconds=time.perf_counter() - start)
+                return result
+
+            key = ('step', fn.__name__, table_store.data_version(run.required_tables), filter_key)
+            return cache.get(key, compute)
+
+        run.inputs = inputs
+        run.required_tables = merge_requirements(tables, *[upstream.required_tables for upstream in inputs])
+        STEPS[fn.__name__] = run
+        return run
+    return decorator
+
+
+@contextmanager
+def evaluation(table_store, cache, filter_key):
+    # Steps called while this is active are memoized under filter_key, which must identify how
+    # the dataframes handed to them were filtered
+    previous = getattr(_scope, 'current', None)
+    _scope.current = (table_store, cache, filter_key)
+    try:
+        yield
+    finally:
+        _scope.current = previous
+
+
+def _record(name, calls=0, runs=0, seconds=0.0):
+    with _stats_lock:
+        stats = _stats.setdefault(name, {'calls': 0, 'runs': 0, 'seconds': 0.0})
+        stats['calls'] += calls
+        stats['runs'] += runs
+        stats['seconds'] += seconds
+
+
+def step_report():
+    # One row per step: how often charts asked for it, how often it actually ran, and its own run time
+    with _stats_lock:
+        stats = {name: dict(values) for name, values in _stats.items()}
+    rows = []
+    for name, run in STEPS.items():
+        values = stats.get(name, {'calls': 0, 'runs': 0, 'seconds': 0.0})
+        rows.append({
+            'Step': name,
+            'Inputs': ', '.join(upstream.__name__ for upstream in run.inputs),
+            'Calls': values['calls'],
+            'Runs': values['runs'],
+            'Reused': values['calls'] - values['runs'],
+            'Seconds': round(values['seconds'], 3),
+        })
+    return pd.DataFrame(rows, columns=['Step', 'Inputs', 'Calls', 'Runs', 'Reused', 'Seconds'])
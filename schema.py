@@ -0,0 +1,148 @@
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    STRING = 'string[pyarrow]'
+except ImportError:
+    STRING = 'string'
+
+
+# Bump when SCHEMAS changes so stale snapshots get rebuilt
+SCHEMA_VERSION = 1
+
+DATETIME = 'datetime'
+
+# Column dtypes applied once at load: compact int keys, string/categorical
+# labels, parsed dates. Integer columns that turn out to hold NaN fall back
+# to the matching nullable dtype (int32 -> Int32).
+SCHEMAS = {
+    'Product': {
+        'ProductID': 'int32',
+        'Name': STRING,
+        'ProductNumber': STRING,
+        'Color': 'category',
+        'SafetyStockLevel': 'int32',
+        'ReorderPoint': 'int32',
+        'StandardCost': 'float64',
+        'ListPrice': 'float64',
+        'ProductLine': 'category',
+        'Class': 'category',
+        'Style': 'category',
+        'ProductSubcategoryID': 'Int32',
+        'ProductModelID': 'Int32',
+        'SellStartDate': DATETIME,
+        'SellEndDate': DATETIME,
+        'ModifiedDate': DATETIME,
+    },
+    'ProductSubcategory': {
+        'ProductSubcategoryID': 'int32',
+        'ProductCategoryID': 'int32',
+        'Name': STRING,
+        'ModifiedDate': DATETIME,
+    },
+    'ProductCategory': {
+        'ProductCategoryID': 'int32',
+        'Name': STRING,
+        'ModifiedDate': DATETIME,
+    },
+    'ProductInventory': {
+        'ProductID': 'int32',
+        'LocationID': 'int32',
+        'Shelf': 'category',
+        'Bin': 'int16',
+        'Quantity': 'int32',
+        'ModifiedDate': DATETIME,
+    },
+    'Location': {
+        'LocationID': 'int32',
+        'Name': STRING,
+        'CostRate': 'float32',
+        'Availability': 'float32',
+        'ModifiedDate': DATETIME,
+    },
+    'ScrapReason': {
+        'ScrapReasonID': 'int16',
+        'Name': STRING,
+        'ModifiedDate': DATETIME,
+    },
+    'WorkOrder': {
+        'WorkOrderID': 'int32',
+        'ProductID': 'int32',
+        'OrderQty': 'int32',
+        'StockedQty': 'int32',
+        'ScrappedQty': 'int32',
+        'StartDate': DATETIME,
+        'EndDate': DATETIME,
+        'DueDate': DATETIME,
+        'ScrapReasonID': 'Int16',
+        'ModifiedDate': DATETIME,
+    },
+    'WorkOrderRouting': {
+        'WorkOrderID': 'int32',
+        'ProductID': 'int32',
+        'OperationSequence': 'int16',
+        'LocationID': 'int32',
+        'ScheduledStartDate': DATETIME,
+        'ScheduledEndDate': DATETIME,
+        'ActualStartDate': DATETIME,
+        'ActualEndDate': DATETIME,
+        'ActualResourceHrs': 'float32',
+        'PlannedCost': 'float64',
+        'ActualCost': 'float64',
+        'ModifiedDate': DATETIME,
+    },
+    'SalesOrderDetail': {
+        'SalesOrderID': 'int32',
+        'SalesOrderDetailID': 'int32',
+        'CarrierTrackingNumber': STRING,
+        'OrderQty': 'int32',
+        'ProductID': 'int32',
+        'SpecialOfferID': 'int32',
+        'UnitPrice': 'float64',
+        'UnitPriceDiscount': 'float32',
+        'LineTotal': 'float64',
+        'ModifiedDate': DATETIME,
+    },
+    'SalesOrderHeader': {
+        'SalesOrderID': 'int32',
+        'OrderDate': DATETIME,
+        'DueDate': DATETIME,
+        'ShipDate': DATETIME,
+        'Status': 'int8',
+        'CustomerID': 'int32',
+        'SalesPersonID': 'Int32',
+        'TerritoryID': 'Int32',
+        'SubTotal': 'float64',
+        'TaxAmt': 'float64',
+        'Freight': 'float64',
+        'TotalDue': 'float64',
+        'ModifiedDate': DATETIME,
+    },
+    'SalesTerritory': {
+        'TerritoryID': 'int32',
+        'Name': STRING,
+        'CountryRegionCode': 'category',
+        'Group': 'category',
+        'SalesYTD': 'float64',
+        'SalesLastYear': 'float64',
+        'ModifiedDate': DATETIME,
+    },
+}
+
+
+def _nullable(dtype):
+    return dtype[0].upper() + dtype[1:]
+
+
+def apply_schema(table_name, df, columns=None):
+    for column, dtype in SCHEMAS.get(table_name, {}).items():
+        if column not in df.columns or (columns is not None and column not in columns):
+            continue
+        if dtype == DATETIME:
+            df[column] = pd.to_datetime(df[column], errors='coerce')
+        elif dtype.startswith(('int', 'Int')):
+            values = pd.to_numeric(df[column], errors='coerce')
+            df[column] = values.astype(_nullable(dtype) if values.isna().any() else dtype)
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
@@ -0,0 +1,101 @@
+import heapq
+import os
+
+import numpy as np
+import pandas as pd
+
+from kernels import group_sum
+
+
+# Leaderboards are read off sketches instead of exact group-bys when set (they can also be switched on in the app)
+APPROX_TOP_K = os.environ.get('APPROX_TOP_K', '0') == '1'
+# Counters kept per sketch; a monitored total overestimates the true one by at most Total / capacity
+SKETCH_CAPACITY = int(os.environ.get('SKETCH_CAPACITY', 256))
+# Rows pre-aggregated together while streaming a table into a sketch
+SKETCH_CHUNK_ROWS = 1 << 18
+
+
+class SpaceSaving:
+    # Weighted SpaceSaving heavy-hitter summary: at most `capacity` (key, count, error) counters.
+    # For a monitored key the true total lies in [count - error, count]; an unmonitored key's
+    # total is at most the smallest count. Weights must be non-negative.
+    def __init__(self, capacity=SKETCH_CAPACITY, key_name='Key'):
+        self.capacity = capacity
+        self.key_name = key_name
+        self.total = 0.0
+        self._counts = {}
+        self._errors = {}
+        # (count, key) min-heap over the counters; entries whose count has since changed are stale
+        self._heap = []
+
+    def update(self, keys, weights):
+        # Streams the rows in chunks; each chunk is summed per key first, which is a valid
+        # (shorter) weighted stream of the same items
+        keys = pd.Series(keys).reset_index(drop=True)
+        weights = pd.Series(weights).reset_index(drop=True)
+        for start in range(0, len(keys), SKETCH_CHUNK_ROWS):
+            chunk_keys = keys.iloc[start:start + SKETCH_CHUNK_ROWS]
+            chunk_weights = weights.iloc[start:start + SKETCH_CHUNK_ROWS]
+            present = chunk_keys.notna() & chunk_weights.notna()
+            batch = group_sum(chunk_keys[present], chunk_weights[present].astype(np.float64))
+            self.total += float(batch.sum())
+            # Lightest first, so a chunk's heavy keys are not the ones evicted by its light ones
+            for key, weight in batch.sort_values(kind='stable').items():
+                self._add(key, weight)
+        return self
+
+    def _add(self, key, weight):
+        if key in self._counts:
+            self._counts[key] += weight
+        elif len(self._counts) < self.capacity:
+            self._counts[key] = weight
+            self._errors[key] = 0.0
+        else:
+            # The smallest counter hands its slot to the new key, which inherits its count as error
+            floor, victim = self._pop_min()
+            del self._counts[victim]
+            del self._errors[victim]
+            self._counts[key] = floor + weight
+            self._errors[key] = floor
+        heapq.heappush(self._heap, (self._counts[key], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, key) for key, count in self._counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self._counts.get(key) == count:
+                return count, key
+
+    def floor(self):
+        # Upper bound on the total of any key the sketch does not monitor
+        return min(self._counts.values()) if len(self._counts) >= self.capacity else 0.0
+
+    def top(self, k):
+        # Top-k estimates; Guaranteed marks keys whose lower bound beats every key outside the top-k
+        ranked = self.to_frame()
+        top = ranked.head(k).copy()
+        outside = max(ranked['Count'].iloc[k] if len(ranked) > k else 0.0, self.floor())
+        top['Guaranteed'] = top['Count'] - top['Error'] >= outside
+        return top
+
+    def to_frame(self):
+        frame = pd.DataFrame({
+            self.key_name: list(self._counts),
+            'Count': list(self._counts.values()),
+            'Error': [self._errors[key] for key in self._counts],
+        })
+        frame = frame.sort_values('Count', ascending=False, kind='stable').reset_index(drop=True)
+        frame.attrs.update(total=self.total, capacity=self.capacity)
+        return frame
+
+    @classmethod
+    def from_frame(cls, frame):
+        sketch = cls(frame.attrs['capacity'], frame.columns[0])
+        sketch.total = frame.attrs['total']
+        sketch._counts = dict(zip(frame.iloc[:, 0], frame['Count']))
+        sketch._errors = dict(zip(frame.iloc[:, 0], frame['Error']))
+        sketch._heap = [(count, key) for key, count in sketch._counts.items()]
+        heapq.heapify(sketch._heap)
+        return sketch
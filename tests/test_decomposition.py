@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from decomposition import decompose, seasonal_strength
+
+
+def series(n_months, n_series=3, seed=0):
+    rng = np.random.default_rng(seed)
+    months = np.arange(n_months)[:, None]
+    pattern = rng.normal(0, 10, (12, n_series))
+    return 50 + 0.8 * months + pattern[months[:, 0] % 12] + rng.normal(0, 2, (n_months, n_series))
+
+
+@pytest.mark.parametrize('n_months', [24, 37, 50])
+def test_matches_statsmodels_additive(n_months):
+    seasonal_decompose = pytest.importorskip('statsmodels.tsa.seasonal').seasonal_decompose
+    matrix = series(n_months)
+    trend, seasonal, resid = decompose(matrix)
+    for column in range(matrix.shape[1]):
+        expected = seasonal_decompose(matrix[:, column], model='additive', period=12)
+        np.testing.assert_allclose(trend[:, column], expected.trend, equal_nan=True)
+        np.testing.assert_allclose(seasonal[:, column], expected.seasonal)
+        np.testing.assert_allclose(resid[:, column], expected.resid, equal_nan=True)
+
+
+def test_recovers_trend_and_season_with_edges_trimmed():
+    months = np.arange(36)
+    pattern = np.r_[np.arange(6), -np.arange(6)].astype(np.float64)
+    pattern -= pattern.mean()
+    matrix = (10 + 2.0 * months + pattern[months % 12])[:, None]
+    trend, seasonal, resid = decompose(matrix)
+
+    # The centred 2x12 average loses half a window at each end
+    assert np.isnan(trend[:6]).all() and np.isnan(trend[-6:]).all()
+    assert np.isnan(resid[:6]).all() and np.isnan(resid[-6:]).all()
+    np.testing.assert_allclose(trend[6:-6, 0], 10 + 2.0 * months[6:-6])
+    np.testing.assert_allclose(seasonal[:, 0], pattern[months % 12], atol=1e-12)
+    np.testing.assert_allclose(resid[6:-6], 0, atol=1e-12)
+    assert seasonal_strength(seasonal, resid)[0] == pytest.approx(1.0)
+
+
+def test_short_history_returns_none():
+    assert decompose(series(23)) is None
+    assert decompose(series(0)) is None
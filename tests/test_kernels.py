@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import kernels
+from kernels import group_mean, group_sum
+
+
+def frame(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    sparse_ids = np.array([3, 17, 250, 9001, 40000])
+    values = rng.normal(100, 25, n)
+    values[rng.random(n) < 0.1] = np.nan
+    return pd.DataFrame({
+        'ProductID': rng.choice(sparse_ids, n).astype(np.int32),
+        'LocationID': rng.integers(1, 8, n).astype(np.int16),
+        'OrderQty': rng.integers(0, 50, n),
+        'LineTotal': values,
+    })
+
+
+@pytest.mark.parametrize('kernel, how', [(group_sum, 'sum'), (group_mean, 'mean')])
+def test_single_key_matches_groupby(kernel, how):
+    df = frame()
+    for column in ['OrderQty', 'LineTotal']:
+        expected = getattr(df[column].groupby(df['ProductID']), how)()
+        pd.testing.assert_series_equal(kernel(df['ProductID'], df[column]), expected)
+
+
+@pytest.mark.parametrize('kernel, how', [(group_sum, 'sum'), (group_mean, 'mean')])
+def test_multi_key_frame_matches_groupby(kernel, how):
+    df = frame()
+    keys = [df['ProductID'], df['LocationID']]
+    values = df[['OrderQty', 'LineTotal']]
+    pd.testing.assert_frame_equal(kernel(keys, values), getattr(values.groupby(keys), how)())
+
+
+@pytest.mark.parametrize('kernel, how', [(group_sum, 'sum'), (group_mean, 'mean')])
+def test_missing_keys_are_dropped(kernel, how):
+    df = frame()
+    keys = df['ProductID'].astype('float64')
+    keys[::7] = np.nan
+    pd.testing.assert_series_equal(kernel(keys, df['LineTotal']), getattr(df['LineTotal'].groupby(keys), how)())
+
+
+def test_all_nan_group():
+    keys = pd.Series([1, 1, 5, 5], dtype=np.int32)
+    values = pd.Series([np.nan, np.nan, 2.0, 4.0])
+    pd.testing.assert_series_equal(group_sum(keys, values), values.groupby(keys).sum())
+    pd.testing.assert_series_equal(group_mean(keys, values), values.groupby(keys).mean())
+
+
+@pytest.mark.parametrize('kernel, how', [(group_sum, 'sum'), (group_mean, 'mean')])
+def test_wide_key_range_falls_back(kernel, how, monkeypatch):
+    monkeypatch.setattr(kernels, 'MAX_DIRECT_SLOTS', 100)
+    df = frame()
+    pd.testing.assert_series_equal(kernel(df['ProductID'], df['LineTotal']), getattr(df['LineTotal'].groupby(df['ProductID']), how)())
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from moments import Moments, partition_moments
+
+
+def metrics(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({'SalesQty': rng.normal(100, 20, n), 'InventoryQty': rng.normal(80, 10, n)})
+    frame['Stock_Shortage'] = frame['SalesQty'] - frame['InventoryQty']
+    frame['ProductionDelayDays'] = 0.3 * frame['SalesQty'] + rng.normal(0, 5, n)
+    frame.iloc[::11, 1] = np.nan
+    keys = pd.Series(rng.choice([0, 2, 5, 31], n), index=frame.index, name='ProductSubcategoryID')
+    return keys, frame
+
+
+def test_merged_partitions_equal_moments_of_concatenated_data():
+    keys, frame = metrics()
+    partitions = partition_moments(keys, frame)
+    merged = Moments.from_partitions(list(frame.columns), partitions)
+    complete = frame.dropna()
+    assert merged.count == len(complete)
+    np.testing.assert_allclose(merged.sums, complete.sum().to_numpy())
+    np.testing.assert_allclose(merged.cross, complete.T.to_numpy() @ complete.to_numpy())
+    np.testing.assert_allclose(merged.covariance(), complete.cov().to_numpy())
+    pd.testing.assert_frame_equal(merged.corr(), complete.corr(), atol=1e-10)
+
+
+def test_selected_partitions_equal_moments_of_their_rows():
+    keys, frame = metrics()
+    selected = [2, 31]
+    partitions = partition_moments(keys, frame)
+    merged = Moments.from_partitions(list(frame.columns), partitions[partitions['ProductSubcategoryID'].isin(selected)])
+    pd.testing.assert_frame_equal(merged.corr(), frame[keys.isin(selected)].dropna().corr(), atol=1e-10)
+
+
+def test_too_few_rows_give_nan():
+    frame = pd.DataFrame({'a': [1.0], 'b': [2.0]})
+    merged = Moments.from_partitions(['a', 'b'], partition_moments(pd.Series([1]), frame))
+    assert merged.corr().isna().all().all()
+    assert np.isnan(Moments.from_partitions(['a', 'b'], partition_moments(pd.Series([1]), frame.iloc[:0])).covariance()).all()